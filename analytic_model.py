@@ -0,0 +1,121 @@
+"""Analytic estimate of the warehouse performance - for screening configurations before simulating them.
+
+The warehouse is the semi-open queueing network of Lamballais et al.'s M1 model: orders wait
+in an external queue for a robot, and a robot serves an order in a cycle - travel to the pod and
+lift it, travel to a workstation, picking, travel to an empty spot and store the pod. As in
+Simulation, picking starts as soon as the robot reaches the workstation, so every station of the
+robots network is a delay station and the network reduces to an M/G/N queue with the N robots as
+servers and the cycle as the service time. The queue is approximated by Allen-Cunneen.
+
+The travel time moments come from the real layout: pods and empty spots are taken uniformly over
+the storage spots, workstations uniformly over the workstations.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from system_objects import Warehouse
+
+
+def mean_abs_diff(values):
+    """Mean of |a - b| over all ordered pairs (a, b) of values, in O(n log n)"""
+    x = np.sort(np.asarray(values, dtype=float))
+    n = len(x)
+    return float(2 * np.sum(x * (2 * np.arange(n) - n + 1)) / n ** 2)
+
+
+def pair_distance_moments(xy):
+    """Mean and variance of the cityblock distance between two random points of a rectangular grid"""
+    xs, ys = xy[:, 0], xy[:, 1]
+    mean_dx, mean_dy = mean_abs_diff(xs), mean_abs_diff(ys)
+    # E[dx^2] = 2 Var(x); x and y are independent on a rectangular grid
+    second = 2 * xs.var() + 2 * ys.var() + 2 * mean_dx * mean_dy
+    mean = mean_dx + mean_dy
+    return mean, second - mean ** 2
+
+
+def as_hashable(value):
+    # lists (e.g. ws_positions) become tuples, so the parameters can key the cache
+    if isinstance(value, (list, tuple)):
+        return tuple(as_hashable(item) for item in value)
+    return value
+
+
+@lru_cache(maxsize=32)
+def layout_travel_moments(warehouse_params=()):
+    """
+    Mean and variance of the travel distances of a robot cycle, for Warehouse(**dict(warehouse_params))
+    - to_pod - from the spot the robot stored its last pod to the pod of the next order
+    - to_ws - from the pod's spot to a workstation
+    - to_spot - from a workstation to an empty spot
+    """
+    warehouse = Warehouse(r_amount=0, **dict(warehouse_params))
+    warehouse.build_warehouse()
+    spot_xy = warehouse.grid.spot_xy.reshape(-1, 2)
+    to_pod = pair_distance_moments(spot_xy)
+    spot_to_ws = warehouse.travel.spot_to_ws
+    ws_to_spot = warehouse.travel.ws_to_spot
+    return {
+        'to_pod': to_pod,
+        'to_ws': (float(spot_to_ws.mean()), float(spot_to_ws.var())),
+        'to_spot': (float(ws_to_spot.mean()), float(ws_to_spot.var())),
+        'n_spots': len(spot_xy),
+        'n_workstations': len(warehouse.ws_list),
+    }
+
+
+def erlang_c(servers, offered_load):
+    """Probability that an arrival waits in an M/M/c queue (offered_load = arrival rate * mean service time)"""
+    erlang_b = 1.0
+    for k in range(1, servers + 1):
+        erlang_b = offered_load * erlang_b / (k + offered_load * erlang_b)
+    utilization = offered_load / servers
+    return erlang_b / (1 - utilization * (1 - erlang_b))
+
+
+def estimate_performance(robot_num, order_enter_rate, speed=1.3, picking_rate=None, lift_time=1.0,
+                         store_time=1.0, warehouse_params=None):
+    """
+    Approximate steady state performance of Simulation(robot_num, order_enter_rate, warehouse_params=...).
+    speed, lift_time and store_time default to the Robot defaults, picking_rate to the warehouse's.
+    The sojourn time of an unstable configuration is inf.
+    """
+    warehouse_params = warehouse_params or {}
+    if picking_rate is None:
+        picking_rate = warehouse_params.get('picking_rate', 1.0 / 15)
+    moments = layout_travel_moments(tuple(sorted((key, as_hashable(value)) for key, value in warehouse_params.items())))
+    to_pod, to_ws, to_spot = moments['to_pod'], moments['to_ws'], moments['to_spot']
+
+    # the order leaves at the end of picking, the robot only after storing the pod
+    order_service = (to_pod[0] + to_ws[0]) / speed + lift_time + 1.0 / picking_rate
+    cycle_mean = order_service + to_spot[0] / speed + store_time
+    cycle_var = (to_pod[1] + to_ws[1] + to_spot[1]) / speed ** 2 + 1.0 / picking_rate ** 2
+    cycle_scv = cycle_var / cycle_mean ** 2
+
+    max_throughput = robot_num / cycle_mean
+    offered_load = order_enter_rate * cycle_mean
+    utilization = offered_load / robot_num
+    res = {
+        'robot_num': robot_num,
+        'order_enter_rate': order_enter_rate,
+        'mean_cycle_time': cycle_mean,
+        'cycle_scv': cycle_scv,
+        'max_throughput': max_throughput,
+        'throughput': min(order_enter_rate, max_throughput),
+        'robot_utilization': min(utilization, 1.0),
+        'stable': utilization < 1,
+    }
+    if utilization < 1:
+        # Allen-Cunneen approximation of the M/G/N waiting time
+        wait = erlang_c(robot_num, offered_load) / (robot_num / cycle_mean - order_enter_rate) * (1 + cycle_scv) / 2
+        res['mean_wait_for_robot'] = wait
+        res['mean_sojourn'] = wait + order_service
+        res['mean_wip'] = order_enter_rate * res['mean_sojourn']
+    else:
+        res['mean_wait_for_robot'] = res['mean_sojourn'] = res['mean_wip'] = float('inf')
+    return res
+
+
+def screen(cells, **model_params):
+    """estimate_performance of every cell (dict with robot_num, order_enter_rate and optional warehouse_params)"""
+    return [estimate_performance(**cell, **model_params) for cell in cells]
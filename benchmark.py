@@ -0,0 +1,121 @@
+"""Benchmark suite of the simulation engine - throughput and scaling on fixed seeds.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --threshold 0.1
+
+Every scenario is run three times: a plain timed run (events per second, wall time per
+simulated day), an instrumented run (per handler breakdown) and a run under
+tracemalloc (peak Python memory). With --baseline, scenarios whose events per second
+dropped by more than the threshold are reported as regressions and the exit code is 1.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from simulation import Simulation
+
+DAY = 24 * 60 * 60
+SEED = 2019
+
+# name -> Simulation parameters (time_limit is set by the suite), warehouse_params can scale the layout
+SCENARIOS = {}
+for robot_num in (2, 10, 35):
+    for orders_per_hour in (200, 500):
+        SCENARIOS[f'robots_{robot_num}_rate_{orders_per_hour}'] = dict(robot_num=robot_num,
+                                                                       order_enter_rate=orders_per_hour / 3600.0)
+# scaled warehouses, at about 2/3 of their capacity
+SCENARIOS['large_12800_pods_robots_100_rate_600'] = dict(
+    robot_num=100, order_enter_rate=600 / 3600.0,
+    warehouse_params=dict(pa=40, ca=31, n_workstations=10, number_of_types=1000))
+SCENARIOS['xl_51200_pods_robots_1000_rate_3600'] = dict(
+    robot_num=1000, order_enter_rate=3600 / 3600.0,
+    warehouse_params=dict(pa=80, ca=63, n_workstations=40, number_of_types=5000))
+
+
+def run_scenario(name, params, time_limit, seed=SEED, with_memory=True):
+    res = {'name': name, 'params': params, 'time_limit': time_limit, 'seed': seed}
+
+    # plain timed run
+    build_start = time.perf_counter()
+    simu_instance = Simulation(time_limit=time_limit, seed=seed, **params)
+    run_start = time.perf_counter()
+    simu_instance.run_simulation()
+    run_time = time.perf_counter() - run_start
+    res['build_sec'] = run_start - build_start
+    res['run_sec'] = run_time
+    res['n_events'] = simu_instance.n_events
+    res['events_per_sec'] = simu_instance.n_events / run_time
+    res['wall_sec_per_sim_day'] = run_time / (simu_instance.curr_time / DAY)
+    res['n_served'] = simu_instance.stats.n_served
+
+    # handlers breakdown
+    simu_instance = Simulation(time_limit=time_limit, seed=seed, **params)
+    instrumentation = simu_instance.instrument(track_lengths=False)
+    simu_instance.run_simulation()
+    res['handler_sec'] = {name: stats['handler_sec'] for name, stats in instrumentation.summary()['events'].items()}
+
+    # peak memory
+    if with_memory:
+        tracemalloc.start()
+        simu_instance = Simulation(time_limit=time_limit, seed=seed, **params)
+        simu_instance.run_simulation()
+        res['peak_mem_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return res
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Names of the scenarios whose events per second dropped by more than threshold"""
+    base_by_name = {res['name']: res for res in baseline['scenarios']}
+    regressions = []
+    for res in results['scenarios']:
+        base = base_by_name.get(res['name'])
+        if base is None:
+            continue
+        change = res['events_per_sec'] / base['events_per_sec'] - 1
+        res['events_per_sec_change'] = change
+        if change < -threshold:
+            regressions.append(res['name'])
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the simulation engine')
+    parser.add_argument('--days', type=float, default=1.0, help='simulated days per scenario')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), help='scenarios to run (all if not given)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory run')
+    parser.add_argument('--output', help='results JSON file')
+    parser.add_argument('--baseline', help='results JSON file to compare to')
+    parser.add_argument('--threshold', type=float, default=0.1, help='events per second drop reported as regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.scenarios or list(SCENARIOS)
+    results = {'python': sys.version.split()[0], 'platform': platform.platform(), 'days': args.days, 'scenarios': []}
+    for name in names:
+        res = run_scenario(name, SCENARIOS[name], args.days * DAY, with_memory=not args.no_memory)
+        results['scenarios'].append(res)
+        print(f'{name:40s} {res["events_per_sec"]:12.0f} events/s {res["wall_sec_per_sim_day"]:8.3f} s/day '
+              f'{res.get("peak_mem_mb", float("nan")):8.2f} MB')
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        results['regressions'] = regressions
+        for res in results['scenarios']:
+            if res['name'] in regressions:
+                print(f'REGRESSION {res["name"]}: events per second changed by {res["events_per_sec_change"]:+.1%}')
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import numpy as np
+
+from random_streams import spawn_seeds
+from result_cache import scenario_key
+from simulation import Simulation
+
+
+def pilot_run(robot_num, order_enter_rate, pilot_time, seed=None, warmup_dur=0.1, drift_tol=0.02,
+              check_interval=None, warehouse_params=None):
+    """
+    Short run that decides whether order_enter_rate is stable for robot_num robots.
+    The stability statistic is the drift of the number of orders in the system after the warm-up,
+    relative to the enter rate; the rate is unstable if it is above drift_tol. The run stops early
+    once the backlog growth is twice the growth allowed over the whole run.
+    """
+    simu_instance = Simulation(time_limit=pilot_time, robot_num=robot_num, order_enter_rate=order_enter_rate,
+                               warmup_dur=warmup_dur, seed=seed, trajectory_mode='sample',
+                               trajectory_step=pilot_time, warehouse_params=warehouse_params)
+    if check_interval is None:
+        check_interval = pilot_time / 50
+    simu_instance.run_until(warmup_dur * pilot_time)
+    warmup_time = simu_instance.curr_time
+    warmup_wip = simu_instance.stats.wip
+
+    allowed_growth = drift_tol * order_enter_rate * (pilot_time - warmup_time)
+    next_check = warmup_time + check_interval
+    stopped_early = False
+    while not simu_instance.is_finished():
+        simu_instance.run_until(next_check)
+        next_check += check_interval
+        if simu_instance.stats.wip - warmup_wip > 2 * allowed_growth:
+            stopped_early = True
+            break
+
+    duration = simu_instance.curr_time - warmup_time
+    drift = (simu_instance.stats.wip - warmup_wip) / duration
+    return {
+        'robot_num': robot_num,
+        'order_enter_rate': order_enter_rate,
+        'drift': drift,
+        'stable': drift <= drift_tol * order_enter_rate,
+        'throughput': (simu_instance.stats.n_served - simu_instance.stats.n_served_warmup) / duration,
+        'stopped_early': stopped_early,
+        'end_time': float(simu_instance.curr_time),
+        'n_events': simu_instance.n_events,
+    }
+
+
+def capacity_search(robot_num, initial_rate=0.01, pilot_time=2*86400, rel_tol=0.02, max_pilots=16, step=2.0,
+                    seed=None, warmup_dur=0.1, drift_tol=0.02, warehouse_params=None, cache=None):
+    """
+    Largest stable order enter rate for robot_num robots.
+    The rate is first bracketed by geometric steps (factor step) up or down from initial_rate, then
+    the bracket is bisected until its width is below rel_tol of its upper end (or max_pilots pilot
+    runs were spent).
+    An unstable pilot serves orders at about the capacity, so its throughput is also used
+    as the next guess whenever it falls inside the bracket.
+    All the pilots share one seed - common random numbers keep the stable / unstable
+    decisions monotone in the rate.
+    With a ResultCache the pilot runs are cached; seed is then required, a fresh seed would never hit.
+    Returns the estimate (middle of the bracket), the bracket and all the pilot runs.
+    """
+    if cache is not None and seed is None:
+        raise ValueError('a cached capacity search needs a seed - without one every search gets a fresh seed')
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    pilots = []
+
+    def run_pilot(rate):
+        pilot_params = dict(robot_num=robot_num, order_enter_rate=rate, pilot_time=pilot_time, warmup_dur=warmup_dur,
+                            drift_tol=drift_tol, warehouse_params=warehouse_params)
+        res = None
+        if cache is not None:
+            key = scenario_key(pilot_params, seed, kind='pilot')
+            res = cache.get(key)
+        if res is None:
+            res = pilot_run(seed=seed, **pilot_params)
+            if cache is not None:
+                cache.put(key, res)
+        pilots.append(res)
+        return res
+
+    # bracket [stable_rate, unstable_rate] - geometric steps up or down from initial_rate
+    res = run_pilot(initial_rate)
+    first_stable = res['stable']
+    rate = initial_rate
+    while res['stable'] == first_stable and len(pilots) < max_pilots:
+        rate = rate * step if first_stable else rate / step
+        res = run_pilot(rate)
+    if res['stable'] == first_stable:
+        raise RuntimeError(f'could not bracket the capacity of {robot_num} robots with {max_pilots} pilot runs')
+    stable_rate, unstable_rate = (rate / step, rate) if first_stable else (rate, rate * step)
+
+    # the throughput of an unstable pilot is the guess of the next pilot, used at most every other pilot
+    guess = pilots[-1]['throughput'] if not res['stable'] else pilots[-2]['throughput']
+    while unstable_rate - stable_rate > rel_tol * unstable_rate and len(pilots) < max_pilots:
+        rate = (stable_rate + unstable_rate) / 2
+        margin = rel_tol * unstable_rate / 2
+        is_guess = guess is not None and stable_rate + margin < guess < unstable_rate - margin
+        if is_guess:
+            rate = guess
+        guess = None
+        res = run_pilot(rate)
+        if res['stable']:
+            stable_rate = rate
+        else:
+            unstable_rate = rate
+            if not is_guess:
+                guess = res['throughput']
+
+    return {
+        'robot_num': robot_num,
+        'capacity': (stable_rate + unstable_rate) / 2,
+        'bracket': (stable_rate, unstable_rate),
+        'n_pilots': len(pilots),
+        'pilots': pilots,
+    }
+
+
+def capacity_curve(robot_nums, initial_rate=0.01, seed=None, progress=None, **search_params):
+    """
+    Capacity search for every robot number. The estimate of one robot number, scaled by the ratio
+    of the robot numbers, is the initial rate of the next search.
+    With a cache in search_params, seed is required (see capacity_search).
+    """
+    if search_params.get('cache') is not None and seed is None:
+        raise ValueError('a cached capacity search needs a seed - without one every search gets a fresh seed')
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    search_seeds = spawn_seeds(seed, len(robot_nums))
+    results = []
+    prev = None
+    for robot_num, search_seed in zip(robot_nums, search_seeds):
+        if prev is not None:
+            initial_rate = prev['capacity'] * robot_num / prev['robot_num']
+        prev = capacity_search(robot_num, initial_rate=initial_rate, seed=search_seed, **search_params)
+        results.append(prev)
+        if progress is not None:
+            progress(prev)
+    return results
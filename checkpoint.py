@@ -0,0 +1,77 @@
+"""Checkpoints of a running Simulation - save, restore and fork.
+
+    checkpoint = dumps_simulation(simu_instance)          # after the warm-up
+    variant = fork_simulation(checkpoint, order_enter_rate=0.02, extra_robots=2, time_limit=4 * 604800)
+    variant.run_simulation()
+
+A checkpoint holds the full state - event list, order backlog, robots, pods, workstations,
+statistics and the random streams (with their buffered values) - pickled and zlib
+compressed. A restored simulation continues exactly as the original would have.
+The instrumentation is not saved and a memory mapped trajectory is restored in memory.
+"""
+import pickle
+import zlib
+
+from output_stats import StatisticsCollector
+
+CHECKPOINT_MAGIC = b'WHSIMCK1'
+
+
+def dumps_simulation(simu_instance, level=6):
+    return CHECKPOINT_MAGIC + zlib.compress(pickle.dumps(simu_instance, protocol=pickle.HIGHEST_PROTOCOL), level)
+
+
+def loads_simulation(data):
+    if not data.startswith(CHECKPOINT_MAGIC):
+        raise ValueError('Not a simulation checkpoint')
+    return pickle.loads(zlib.decompress(data[len(CHECKPOINT_MAGIC):]))
+
+
+def save_checkpoint(simu_instance, path):
+    data = dumps_simulation(simu_instance)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def load_checkpoint(path):
+    with open(path, 'rb') as f:
+        return loads_simulation(f.read())
+
+
+def fork_simulation(source, order_enter_rate=None, extra_robots=0, time_limit=None, seed=None, reset_stats=True):
+    """
+    New simulation branched from source (a Simulation or checkpoint bytes), the source is not changed.
+    - order_enter_rate / extra_robots / time_limit - changed parameters of the branch
+    - seed - new seed of the random streams (None keeps the streams of the source, so branches share them)
+    - reset_stats - the branch collects its statistics from the fork time on, as if its warm-up ended there
+    An instability detector of the source is started anew (same settings) if the statistics are reset or the
+    parameters change, its reference point is then the first check of the branch.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        simu_instance = loads_simulation(source)
+    else:
+        simu_instance = loads_simulation(dumps_simulation(source))
+    if seed is not None:
+        simu_instance.streams.reseed(seed)
+        simu_instance.seed = simu_instance.streams.seed
+    if time_limit is not None:
+        simu_instance.time_limit = time_limit
+    if order_enter_rate is not None:
+        simu_instance.set_order_enter_rate(order_enter_rate)
+    if extra_robots:
+        simu_instance.add_robots(extra_robots)
+    if reset_stats:
+        stats = StatisticsCollector()
+        stats.n_arrived = simu_instance.stats.n_arrived
+        stats.n_served = simu_instance.stats.n_served
+        stats.wip = simu_instance.stats.wip
+        stats.end_warmup(simu_instance.curr_time)
+        simu_instance.stats = stats
+        simu_instance.served_orders_while_warmup = stats.n_served_warmup
+        simu_instance.output_analyzer = None
+    detector = simu_instance.instability_detector
+    if detector is not None and (reset_stats or order_enter_rate is not None or extra_robots):
+        simu_instance.detect_instability(detector.check_interval, detector.drift_tol, detector.z,
+                                         detector.confirmations, detector.start_time)
+    return simu_instance
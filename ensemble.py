@@ -0,0 +1,321 @@
+import numpy as np
+
+from event_calendar import ROBOT_LIFTS_POD, ROBOT_BRINGS_POD_TO_WS, FINISHED_PICKING, ROBOT_PUTS_POD_DOWN
+from random_streams import RandomStreams
+from system_objects import Warehouse
+
+
+class EnsembleSimulation:
+    """
+    #### Many replications of the same model advanced in lockstep
+    The state of all the replications (robots, pods, spots, workstations, order backlog and
+    next event times) is kept in NumPy arrays with a leading replication axis. Every step
+    performs the next event of every replication that did not reach the time limit, in one
+    batched update per event type. The model is the one of Simulation: longest idle robot,
+    uniformly chosen free pod, free workstation first (else a random one), picking as soon
+    as the robot arrives and a uniformly chosen empty spot for storing the pod back.
+    Replications are statistically equivalent to Simulation runs, not identical to them.
+    """
+    def __init__(self, n_reps, time_limit, robot_num, order_enter_rate, warmup_dur=0.1, seed=None,
+                 warehouse_params=None, queue_capacity=1024):
+        self.n_reps = n_reps
+        self.time_limit = time_limit
+        self.robot_num = robot_num
+        self.order_enter_rate = order_enter_rate
+        self.warmup_time = warmup_dur * time_limit
+        self.rng = np.random.default_rng(RandomStreams(seed).seed_seq)
+
+        # geometry is the same for all the replications
+        warehouse = Warehouse(r_amount=robot_num, **(warehouse_params or {}))
+        if warehouse.items_per_pod != 1:
+            raise ValueError('EnsembleSimulation supports one item type per pod')
+        warehouse.build_warehouse()
+        robot = warehouse.robot_list[0] if robot_num > 0 else None
+        self.speed = robot.r_speed if robot is not None else 1.3
+        self.lift_time = robot.r_PodLiftTime if robot is not None else 1
+        self.store_time = robot.r_PodStoreTime if robot is not None else 1
+        self.mean_picking = 1.0 / warehouse.ws_list[0].ws_picking_rate
+        self.spot_xy = warehouse.grid.spot_xy.reshape(-1, 2)
+        self.ws_xy = warehouse.travel.ws_xy
+        self.spot_to_ws = warehouse.travel.spot_to_ws
+        self.ws_to_spot = warehouse.travel.ws_to_spot
+        self.n_types = warehouse.number_of_types
+        self.pods_per_type = warehouse.number_of_pods_per_type
+        n_pods = len(warehouse.pods_list)
+        n_spots = len(self.spot_xy)
+        n_ws = len(warehouse.ws_list)
+        # pod p starts in spot p
+        pod_spots = np.arange(n_pods)
+
+        N, R = n_reps, robot_num
+        self.rows = np.arange(N)
+        self.curr_time = np.zeros(N)
+        self.next_arrival = self.rng.exponential(1.0 / order_enter_rate, N)
+        # robots
+        self.robot_time = np.full((N, R), np.inf)
+        self.robot_event = np.zeros((N, R), dtype=np.int8)
+        self.robot_xy = np.zeros((N, R, 2))
+        self.robot_pod = np.full((N, R), -1)
+        self.robot_ws = np.full((N, R), -1)
+        self.robot_enter = np.zeros((N, R))
+        self.robot_idle = np.ones((N, R), dtype=bool)
+        self.idle_seq = np.tile(np.arange(R), (N, 1))
+        self.idle_counter = np.full(N, R)
+        # pods and spots
+        self.pod_in_use = np.zeros((N, n_pods), dtype=bool)
+        self.pod_spot = np.tile(pod_spots, (N, 1))
+        # empty spots as swap-remove lists, like StorageGrid
+        self.empty_spots = np.zeros((N, n_spots), dtype=np.int64)
+        self.n_empty = np.zeros(N, dtype=np.int64)
+        empty = np.setdiff1d(np.arange(n_spots), pod_spots)
+        self.empty_spots[:, :len(empty)] = empty
+        self.n_empty[:] = len(empty)
+        n_typed = self.n_types * self.pods_per_type
+        self.pods_of_item = np.stack([self.rng.permutation(warehouse.number_of_pods)[:n_typed]
+                                      for _ in range(N)]).reshape(N, self.n_types, self.pods_per_type)
+        # number of free pods per item type
+        self.pod_item = np.full((N, n_pods), -1)
+        self.pod_item[self.rows[:, None], self.pods_of_item.reshape(N, -1)] = np.repeat(np.arange(self.n_types),
+                                                                                      self.pods_per_type)
+        self.free_count = np.full((N, self.n_types), self.pods_per_type)
+        # workstations, free ones are handed out first in first out
+        self.ws_free = np.ones((N, n_ws), dtype=bool)
+        self.ws_seq = np.tile(np.arange(n_ws), (N, 1))
+        self.ws_counter = np.full(N, n_ws)
+        # order backlog, removed orders are marked inactive and compacted when the buffer is full
+        self.q_item = np.zeros((N, queue_capacity), dtype=np.int64)
+        self.q_enter = np.zeros((N, queue_capacity))
+        self.q_active = np.zeros((N, queue_capacity), dtype=bool)
+        self.q_tail = np.zeros(N, dtype=np.int64)
+        self.q_len = np.zeros(N, dtype=np.int64)
+        # statistics
+        self.n_arrived = np.zeros(N, dtype=np.int64)
+        self.n_served = np.zeros(N, dtype=np.int64)
+        self.n_served_warmup = np.zeros(N, dtype=np.int64)
+        self.n_arrived_warmup = np.zeros(N, dtype=np.int64)
+        self.wip = np.zeros(N, dtype=np.int64)
+        self.warm = np.zeros(N, dtype=bool)
+        self.warm_start = np.full(N, np.nan)
+        self.wip_area = np.zeros(N)
+        self.wip_last = np.zeros(N)
+        self.sojourn_n = np.zeros(N, dtype=np.int64)
+        self.sojourn_mean = np.zeros(N)
+        self.sojourn_m2 = np.zeros(N)
+        self.n_steps = 0
+
+    def run_simulation(self):
+        active = self.curr_time < self.time_limit
+        while active.any():
+            self.step(np.flatnonzero(active))
+            active = self.curr_time < self.time_limit
+        return self.summaries()
+
+    def step(self, reps):
+        robot_ind = np.argmin(self.robot_time[reps], axis=1)
+        robot_next = self.robot_time[reps, robot_ind]
+        is_arrival = self.next_arrival[reps] <= robot_next
+        event_time = np.where(is_arrival, self.next_arrival[reps], robot_next)
+
+        # time weighted WIP up to this event
+        warm = self.warm[reps]
+        self.wip_area[reps] += np.where(warm, self.wip[reps] * (event_time - self.wip_last[reps]), 0.0)
+        self.wip_last[reps] = event_time
+        self.curr_time[reps] = event_time
+
+        self.perform_arrivals(reps[is_arrival])
+        robot_reps, robot_ind = reps[~is_arrival], robot_ind[~is_arrival]
+        robot_event = self.robot_event[robot_reps, robot_ind]
+        for event_type, handler in ((ROBOT_LIFTS_POD, self.perform_lifts),
+                                    (ROBOT_BRINGS_POD_TO_WS, self.perform_arrivals_ws),
+                                    (FINISHED_PICKING, self.perform_picking_finishes),
+                                    (ROBOT_PUTS_POD_DOWN, self.perform_stores)):
+            mask = robot_event == event_type
+            if mask.any():
+                handler(robot_reps[mask], robot_ind[mask])
+
+        # end of warm-up, after the event that crossed it
+        new_warm = reps[~warm & (event_time >= self.warmup_time)]
+        if len(new_warm):
+            self.warm[new_warm] = True
+            self.warm_start[new_warm] = self.curr_time[new_warm]
+            self.n_served_warmup[new_warm] = self.n_served[new_warm]
+            self.n_arrived_warmup[new_warm] = self.n_arrived[new_warm]
+        self.n_steps += 1
+        return
+
+    def pick_free_pods(self, reps, items):
+        """Uniformly chosen free pod of every (rep, item), -1 if the item has no free pod"""
+        pods = self.pods_of_item[reps, items]
+        free = ~self.pod_in_use[reps[:, None], pods]
+        keys = np.where(free, self.rng.random(pods.shape) + 1.0, 0.0)
+        best = np.argmax(keys, axis=1)
+        return np.where(free.any(axis=1), pods[np.arange(len(reps)), best], -1)
+
+    def assign_orders(self, reps, robots, pods, enter_times):
+        self.robot_idle[reps, robots] = False
+        self.robot_pod[reps, robots] = pods
+        self.robot_enter[reps, robots] = enter_times
+        self.set_pods_in_use(reps, pods, True)
+        pod_xy = self.spot_xy[self.pod_spot[reps, pods]]
+        dist = np.abs(self.robot_xy[reps, robots] - pod_xy).sum(axis=1)
+        self.robot_xy[reps, robots] = pod_xy
+        self.robot_time[reps, robots] = self.curr_time[reps] + dist / self.speed + self.lift_time
+        self.robot_event[reps, robots] = ROBOT_LIFTS_POD
+        return
+
+    def set_pods_in_use(self, reps, pods, in_use):
+        self.pod_in_use[reps, pods] = in_use
+        items = self.pod_item[reps, pods]
+        typed = items >= 0
+        self.free_count[reps[typed], items[typed]] += -1 if in_use else 1
+        return
+
+    def perform_arrivals(self, reps):
+        if len(reps) == 0:
+            return
+        items = self.rng.integers(self.n_types, size=len(reps))
+        self.n_arrived[reps] += 1
+        self.wip[reps] += 1
+        idle_keys = np.where(self.robot_idle[reps], self.idle_seq[reps], np.iinfo(np.int64).max)
+        robots = np.argmin(idle_keys, axis=1) if self.robot_num > 0 else np.zeros(len(reps), dtype=np.int64)
+        has_robot = self.robot_idle[reps].any(axis=1)
+        pods = self.pick_free_pods(reps, items)
+        served = has_robot & (pods >= 0)
+        if served.any():
+            self.assign_orders(reps[served], robots[served], pods[served], self.curr_time[reps[served]])
+        if (~served).any():
+            self.enqueue(reps[~served], items[~served])
+        self.next_arrival[reps] = self.curr_time[reps] + self.rng.exponential(1.0 / self.order_enter_rate, len(reps))
+        return
+
+    def perform_lifts(self, reps, robots):
+        spots = self.pod_spot[reps, self.robot_pod[reps, robots]]
+        # the spot joins the empty spots
+        self.empty_spots[reps, self.n_empty[reps]] = spots
+        self.n_empty[reps] += 1
+        ws_keys = np.where(self.ws_free[reps], self.ws_seq[reps], np.iinfo(np.int64).max)
+        ws = np.argmin(ws_keys, axis=1)
+        no_free = ~self.ws_free[reps].any(axis=1)
+        ws[no_free] = self.rng.integers(self.ws_free.shape[1], size=no_free.sum())
+        self.ws_free[reps, ws] = False
+        self.robot_ws[reps, robots] = ws
+        self.robot_xy[reps, robots] = self.ws_xy[ws]
+        self.robot_time[reps, robots] = self.curr_time[reps] + self.spot_to_ws[spots, ws] / self.speed
+        self.robot_event[reps, robots] = ROBOT_BRINGS_POD_TO_WS
+        return
+
+    def perform_arrivals_ws(self, reps, robots):
+        self.robot_time[reps, robots] = self.curr_time[reps] + self.rng.exponential(self.mean_picking, len(reps))
+        self.robot_event[reps, robots] = FINISHED_PICKING
+        return
+
+    def perform_picking_finishes(self, reps, robots):
+        # finish service of the order
+        sojourn = self.curr_time[reps] - self.robot_enter[reps, robots]
+        self.n_served[reps] += 1
+        self.wip[reps] -= 1
+        warm = self.warm[reps]
+        if warm.any():
+            warm_reps = reps[warm]
+            self.sojourn_n[warm_reps] += 1
+            delta = sojourn[warm] - self.sojourn_mean[warm_reps]
+            self.sojourn_mean[warm_reps] += delta / self.sojourn_n[warm_reps]
+            self.sojourn_m2[warm_reps] += delta * (sojourn[warm] - self.sojourn_mean[warm_reps])
+
+        # the workstation is free again, it keeps its place in line if it already was free
+        ws = self.robot_ws[reps, robots]
+        newly_free = ~self.ws_free[reps, ws]
+        self.ws_seq[reps[newly_free], ws[newly_free]] = self.ws_counter[reps[newly_free]]
+        self.ws_counter[reps[newly_free]] += 1
+        self.ws_free[reps, ws] = True
+
+        # store the pod back in a uniformly chosen empty spot
+        spot_ind = (self.rng.random(len(reps)) * self.n_empty[reps]).astype(np.int64)
+        spots = self.empty_spots[reps, spot_ind]
+        self.n_empty[reps] -= 1
+        last_spots = self.empty_spots[reps, self.n_empty[reps]]
+        self.empty_spots[reps, spot_ind] = last_spots
+        self.pod_spot[reps, self.robot_pod[reps, robots]] = spots
+        self.robot_xy[reps, robots] = self.spot_xy[spots]
+        self.robot_time[reps, robots] = (self.curr_time[reps] + self.ws_to_spot[ws, spots] / self.speed +
+                                         self.store_time)
+        self.robot_event[reps, robots] = ROBOT_PUTS_POD_DOWN
+        return
+
+    def perform_stores(self, reps, robots):
+        self.set_pods_in_use(reps, self.robot_pod[reps, robots], False)
+        self.robot_pod[reps, robots] = -1
+        self.robot_time[reps, robots] = np.inf
+        self.robot_idle[reps, robots] = True
+        self.idle_seq[reps, robots] = self.idle_counter[reps]
+        self.idle_counter[reps] += 1
+
+        # the oldest queued order that has a free pod goes to this robot
+        with_queue = self.q_len[reps] > 0
+        if not with_queue.any():
+            return
+        reps, robots = reps[with_queue], robots[with_queue]
+        item_has_free = self.free_count[reps] > 0
+        tail = self.q_tail[reps].max()
+        candidates = self.q_active[reps, :tail] & item_has_free[np.arange(len(reps))[:, None],
+                                                                self.q_item[reps, :tail]]
+        found = candidates.any(axis=1)
+        if not found.any():
+            return
+        reps, robots = reps[found], robots[found]
+        q_ind = np.argmax(candidates[found], axis=1)
+        items = self.q_item[reps, q_ind]
+        enter_times = self.q_enter[reps, q_ind]
+        self.q_active[reps, q_ind] = False
+        self.q_len[reps] -= 1
+        self.assign_orders(reps, robots, self.pick_free_pods(reps, items), enter_times)
+        return
+
+    def enqueue(self, reps, items):
+        if (self.q_tail[reps] >= self.q_item.shape[1]).any():
+            self.compact_queue()
+        self.q_item[reps, self.q_tail[reps]] = items
+        self.q_enter[reps, self.q_tail[reps]] = self.curr_time[reps]
+        self.q_active[reps, self.q_tail[reps]] = True
+        self.q_tail[reps] += 1
+        self.q_len[reps] += 1
+        return
+
+    def compact_queue(self):
+        capacity = self.q_item.shape[1]
+        # active orders first, keeping their order
+        order = np.argsort(np.where(self.q_active, 0, 1), axis=1, kind='stable')
+        self.q_item = np.take_along_axis(self.q_item, order, axis=1)
+        self.q_enter = np.take_along_axis(self.q_enter, order, axis=1)
+        self.q_active = np.take_along_axis(self.q_active, order, axis=1)
+        self.q_tail = self.q_len.copy()
+        if self.q_tail.max() >= capacity // 2:
+            self.q_item = np.concatenate([self.q_item, np.zeros_like(self.q_item)], axis=1)
+            self.q_enter = np.concatenate([self.q_enter, np.zeros_like(self.q_enter)], axis=1)
+            self.q_active = np.concatenate([self.q_active, np.zeros_like(self.q_active)], axis=1)
+        return
+
+    def summaries(self):
+        """Per replication summary, with the keys of StatisticsCollector.summary"""
+        res = []
+        for rep in range(self.n_reps):
+            end_time = self.curr_time[rep]
+            duration = end_time - self.warm_start[rep]
+            n = int(self.sojourn_n[rep])
+            res.append({
+                'n_arrived': int(self.n_arrived[rep]),
+                'n_served': int(self.n_served[rep] - self.n_served_warmup[rep]),
+                'n_served_warmup': int(self.n_served_warmup[rep]),
+                'n_arrived_warmup': int(self.n_arrived_warmup[rep]),
+                'warmup_time': float(self.warm_start[rep]),
+                'mean_sojourn': float(self.sojourn_mean[rep]) if n else float('nan'),
+                'var_sojourn': float(self.sojourn_m2[rep] / (n - 1)) if n > 1 else float('nan'),
+                'm2_sojourn': float(self.sojourn_m2[rep]),
+                'mean_wip': float((self.wip_area[rep] + self.wip[rep] * (end_time - self.wip_last[rep])) / duration)
+                if duration > 0 else float('nan'),
+                'wip': int(self.wip[rep]),
+                'orders_in_queue': int(self.q_len[rep]),
+                'end_time': float(end_time),
+                'replication': rep,
+            })
+        return res
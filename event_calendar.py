@@ -0,0 +1,86 @@
+import heapq
+from itertools import count
+
+# Integer codes of the event types
+ORDER = 0
+ROBOT_LIFTS_POD = 1
+ROBOT_BRINGS_POD_TO_WS = 2
+FINISHED_PICKING = 3
+ROBOT_PUTS_POD_DOWN = 4
+
+EVENT_NAMES = ('order', 'robot_lifts_pod', 'robot_brings_pod_to_ws', 'finished_picking', 'robot_puts_pod_down')
+
+
+class Event:
+    """
+    #### Event's class
+    ##### attributes
+    - event type (one of the integer codes above)
+    - event start time
+    - event object - the entity the event refers to (order / robot)
+    - cancelled - True if the event was cancelled after being scheduled
+    """
+    __slots__ = ('event_type', 'event_start', 'event_obj', 'cancelled')
+
+    def __init__(self, event_type, event_start, event_obj):
+        self.event_type = event_type
+        self.event_start = event_start
+        self.event_obj = event_obj
+        self.cancelled = False
+
+    def __repr__(self):
+        return EVENT_NAMES[self.event_type] + ' ' + str(self.event_start) + ' ' + str(self.event_obj)
+
+
+class EventCalendar:
+    """
+    #### Future event list
+    Binary heap of events ordered by start time. Events with the same start time are
+    returned in the order they were scheduled. Cancelled events stay in the heap and
+    are skipped when they reach the top.
+    """
+    def __init__(self):
+        self.heap = []
+        self.seq = count()
+        self.n_cancelled = 0
+
+    def __len__(self):
+        return len(self.heap) - self.n_cancelled
+
+    def schedule(self, event_type, event_start, event_obj):
+        event = Event(event_type, event_start, event_obj)
+        heapq.heappush(self.heap, (event_start, next(self.seq), event))
+        return event
+
+    def cancel(self, event):
+        if not event.cancelled:
+            event.cancelled = True
+            self.n_cancelled += 1
+        return
+
+    def next_event(self):
+        while self.heap:
+            event = heapq.heappop(self.heap)[2]
+            if not event.cancelled:
+                return event
+            self.n_cancelled -= 1
+        return None
+
+    def peek_time(self):
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+            self.n_cancelled -= 1
+        if self.heap:
+            return self.heap[0][0]
+        return None
+
+    def __getstate__(self):
+        # the sequence counter is kept as its next value (itertools pickling is deprecated)
+        next_seq = next(self.seq)
+        self.seq = count(next_seq)
+        return {'heap': self.heap, 'next_seq': next_seq, 'n_cancelled': self.n_cancelled}
+
+    def __setstate__(self, state):
+        self.heap = state['heap']
+        self.seq = count(state['next_seq'])
+        self.n_cancelled = state['n_cancelled']
@@ -0,0 +1,273 @@
+import itertools
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+import numpy as np
+
+from ensemble import EnsembleSimulation
+from random_streams import spawn_seeds
+from result_cache import canonical, scenario_key
+from run_export import MANIFEST
+from simulation import Simulation
+
+
+def param_grid(**param_lists):
+    """Cartesian product of parameter lists, as a list of parameter dicts"""
+    names = list(param_lists)
+    return [dict(zip(names, values)) for values in itertools.product(*param_lists.values())]
+
+
+def summarize_simulation(simu_instance, with_trajectory=False):
+    """Compact summary of a finished simulation"""
+    summary = simu_instance.stats.summary(simu_instance.curr_time)
+    summary['orders_in_queue'] = len(simu_instance.orders_in_sys_queue)
+    summary['end_time'] = float(simu_instance.curr_time)
+    if simu_instance.instability_detector is not None:
+        summary.update(simu_instance.instability_detector.result())
+    if with_trajectory:
+        times, order_cnt = simu_instance.wip_trajectory.as_arrays()
+        summary['times'] = np.array(times)
+        summary['order_cnt'] = np.array(order_cnt)
+    return summary
+
+
+def order_records(simu_instance):
+    """Columns of the served orders of a simulation run with keep_orders"""
+    orders = simu_instance.served_orders
+    return {
+        'enter_time': np.array([order.o_enter_time for order in orders], dtype=float),
+        'exit_time': np.array([order.o_exit_time for order in orders], dtype=float),
+        'item': np.array([order.o_item for order in orders], dtype=np.int64),
+    }
+
+
+def run_cell(cell_params, seed, with_trajectory=False, with_orders=False, export_path=None, instability=None):
+    """
+    Runs a single simulation and returns its summary - executed inside the worker processes.
+    instability - None, or the Simulation.detect_instability parameters to end the run early if it explodes
+    """
+    if with_orders:
+        cell_params = dict(cell_params, keep_orders=True)
+    simu_instance = Simulation(seed=seed, **cell_params)
+    if export_path is not None:
+        simu_instance.export_to(export_path)
+    if instability is not None:
+        simu_instance.detect_instability(**instability)
+    simu_instance.run_simulation()
+    summary = summarize_simulation(simu_instance, with_trajectory=with_trajectory)
+    summary.update(cell_params)
+    summary['seed'] = seed
+    if with_orders:
+        summary.pop('keep_orders')
+        summary['orders'] = order_records(simu_instance)
+    return summary
+
+
+def run_ensemble_cell(cell_params, repeat, seed):
+    """Runs all the replications of a cell in lockstep and returns their summaries"""
+    ensemble = EnsembleSimulation(repeat, seed=seed, **cell_params)
+    summaries = ensemble.run_simulation()
+    for summary in summaries:
+        summary.update(cell_params)
+        summary['seed'] = seed
+    return summaries
+
+
+def variance_reduction_params(cell_params, rep, common_random_numbers, antithetic):
+    """Simulation parameters of replication rep of a cell run with common random numbers / antithetic pairs"""
+    cell_params = dict(cell_params)
+    if common_random_numbers:
+        cell_params['presample_picking'] = True
+    if antithetic:
+        cell_params['antithetic'] = rep % 2 == 1
+    return cell_params
+
+
+def dominance_key(cell_params):
+    # the parameters other than the robot number and the enter rate
+    others = {name: value for name, value in cell_params.items() if name not in ('robot_num', 'order_enter_rate')}
+    return json.dumps(others, sort_keys=True, default=canonical)
+
+
+def is_dominated(cell_params, unstable_params):
+    """True if cell_params has no more robots and no lower enter rate than an unstable cell, all else equal"""
+    return (cell_params['robot_num'] <= unstable_params['robot_num'] and
+            cell_params['order_enter_rate'] >= unstable_params['order_enter_rate'] and
+            dominance_key(cell_params) == dominance_key(unstable_params))
+
+
+def skipped_result(cell_params):
+    """Summary of a run not simulated because a run with more robots or a lower enter rate exploded"""
+    return dict(cell_params, unstable=True, skipped=True, detection_time=None, growth_rate=float('nan'),
+                n_served=0, mean_sojourn=float('nan'), m2_sojourn=0.0)
+
+
+def report_progress(n_done, n_total, result):
+    print(f'[{n_done}/{n_total}] robot num = {result["robot_num"]} | '
+          f'enter rate = {result["order_enter_rate"]} | replication = {result["replication"]} | Done')
+
+
+def run_grid(cells, repeat=1, seed=None, max_workers=None, with_trajectory=False, progress=report_progress,
+             cache=None, with_orders=False, export_dir=None, common_random_numbers=False, antithetic=False,
+             instability=None, skip_dominated=True):
+    """
+    Runs every cell (dict of Simulation parameters) repeat times over a process pool.
+    Each run gets its own independent seed, spawned from seed (an int or a SeedSequence, which is not changed -
+    the same SeedSequence gives the same runs again).
+    With common_random_numbers, replication r of every cell uses the same seed, with the picking
+    work drawn at the order arrival, so the cells see the same orders (arrival times, items and
+    picking times). With antithetic, replications 2k and 2k + 1 are an antithetic pair - same seed,
+    antithetic streams in the second one; repeat must be even. See variance_reduction.py for the estimates.
+    With instability (True or a dict of Simulation.detect_instability parameters), runs end once they
+    are confirmed unstable and the summaries have unstable, detection_time and growth_rate. With
+    skip_dominated too, runs are started from the most robots down, and a run with no more robots and
+    no lower enter rate than an unstable one (all else equal) is not simulated at all - its summary is
+    marked skipped.
+    With a ResultCache, runs found in the cache are not simulated again and new runs are stored;
+    seed is then required (ValueError otherwise) - a fresh seed never hits the cache.
+    With with_orders, every summary has an 'orders' dict of per-order columns.
+    With export_dir, every run streams its orders to export_dir/run_<job index> (see run_export.py).
+    Returns the run summaries in the order of the cells and replications.
+    """
+    if cache is not None and seed is None:
+        raise ValueError('a cached sweep needs a seed - without one every call gets a fresh seed and never hits')
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    if antithetic and repeat % 2:
+        raise ValueError(f'antithetic replications come in pairs, repeat must be even, got {repeat}')
+    jobs = [(cell, rep) for cell in cells for rep in range(repeat)]
+    if common_random_numbers or antithetic:
+        # seed number of every job - replication (or pair) number, per cell unless common to all the cells
+        n_seeds = repeat // 2 if antithetic else repeat
+        seeds = spawn_seeds(seed, n_seeds if common_random_numbers else len(cells) * n_seeds)
+        seed_inds = [rep // 2 if antithetic else rep for rep in range(repeat)]
+        if not common_random_numbers:
+            seed_inds = [cell_ind * n_seeds + seed_ind for cell_ind in range(len(cells)) for seed_ind in seed_inds]
+        job_seeds = [seeds[seed_inds[job_ind % len(seed_inds)]] for job_ind in range(len(jobs))]
+        jobs = [(variance_reduction_params(cell, rep, common_random_numbers, antithetic), rep) for cell, rep in jobs]
+    else:
+        job_seeds = spawn_seeds(seed, len(jobs))
+    if instability is True:
+        instability = {}
+    key_options = {'with_trajectory': with_trajectory}
+    if instability is not None:
+        key_options['instability'] = instability
+    results = [None] * len(jobs)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    export_paths = [None] * len(jobs)
+    if export_dir is not None:
+        export_paths = [os.path.join(export_dir, f'run_{job_ind:05d}') for job_ind in range(len(jobs))]
+
+    n_done = 0
+    job_keys = [None] * len(jobs)
+    if cache is not None:
+        for job_ind, (cell, rep) in enumerate(jobs):
+            job_keys[job_ind] = scenario_key(cell, job_seeds[job_ind], **key_options)
+            export_path = export_paths[job_ind]
+            if export_path is not None and not os.path.exists(os.path.join(export_path, MANIFEST)):
+                # the run is simulated again to export it
+                continue
+            # with_orders, an entry whose records are gone is a miss
+            result = cache.get(job_keys[job_ind], with_orders=with_orders)
+            if result is not None:
+                result['replication'] = rep
+                results[job_ind] = result
+                n_done += 1
+                if progress is not None:
+                    progress(n_done, len(jobs), result)
+    pending = [job_ind for job_ind in range(len(jobs)) if results[job_ind] is None]
+    # parameters of the unstable runs
+    unstable_cells = [jobs[job_ind][0] for job_ind, result in enumerate(results)
+                      if result is not None and result.get('unstable')]
+    skip_dominated = skip_dominated and instability is not None
+    if skip_dominated:
+        pending.sort(key=lambda job_ind: -jobs[job_ind][0]['robot_num'])
+
+    def finish_job(job_ind, result):
+        if cache is not None:
+            cached = {name: value for name, value in result.items() if name != 'orders'}
+            cache.put(job_keys[job_ind], cached, orders=result.get('orders'))
+        result['replication'] = jobs[job_ind][1]
+        results[job_ind] = result
+        if result.get('unstable'):
+            unstable_cells.append(jobs[job_ind][0])
+
+    def skip_job(job_ind):
+        # not cached - it depends on the other runs of the sweep
+        result = skipped_result(jobs[job_ind][0])
+        result['replication'] = jobs[job_ind][1]
+        results[job_ind] = result
+
+    def is_skipped(job_ind):
+        return skip_dominated and any(is_dominated(jobs[job_ind][0], unstable) for unstable in unstable_cells)
+
+    if max_workers == 1 or len(pending) <= 1:
+        for job_ind in pending:
+            if is_skipped(job_ind):
+                skip_job(job_ind)
+            else:
+                finish_job(job_ind, run_cell(jobs[job_ind][0], job_seeds[job_ind], with_trajectory, with_orders,
+                                             export_paths[job_ind], instability))
+            n_done += 1
+            if progress is not None:
+                progress(n_done, len(jobs), results[job_ind])
+        return results
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # jobs are submitted as workers free up, so a job dominated by a run that exploded meanwhile is skipped
+        queued = iter(pending)
+        futures = {}
+        while True:
+            for job_ind in queued:
+                if is_skipped(job_ind):
+                    skip_job(job_ind)
+                    n_done += 1
+                    if progress is not None:
+                        progress(n_done, len(jobs), results[job_ind])
+                    continue
+                futures[executor.submit(run_cell, jobs[job_ind][0], job_seeds[job_ind], with_trajectory,
+                                        with_orders, export_paths[job_ind], instability)] = job_ind
+                if len(futures) == max_workers:
+                    break
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_ind = futures.pop(future)
+                finish_job(job_ind, future.result())
+                n_done += 1
+                if progress is not None:
+                    progress(n_done, len(jobs), results[job_ind])
+    return results
+
+
+def run_ensemble_grid(cells, repeat=1, seed=None, max_workers=None, progress=report_progress):
+    """
+    Like run_grid, but the replications of every cell run together in one EnsembleSimulation,
+    so a pool task is a whole cell. Worth it from a few tens of replications per cell.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    cell_seeds = spawn_seeds(seed, len(cells))
+    results = [None] * len(cells)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers == 1:
+        for cell_ind, cell in enumerate(cells):
+            results[cell_ind] = run_ensemble_cell(cell, repeat, cell_seeds[cell_ind])
+            if progress is not None:
+                progress(cell_ind + 1, len(cells), results[cell_ind][-1])
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_ensemble_cell, cell, repeat, cell_seeds[cell_ind]): cell_ind
+                       for cell_ind, cell in enumerate(cells)}
+            for n_done, future in enumerate(as_completed(futures), start=1):
+                cell_ind = futures[future]
+                results[cell_ind] = future.result()
+                if progress is not None:
+                    progress(n_done, len(cells), results[cell_ind][-1])
+    return [summary for cell_results in results for summary in cell_results]
@@ -1,104 +1,144 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
-from simulation import Simulation
+from capacity_search import capacity_curve
+from experiment_runner import run_grid
+from output_stats import RunningStats
+from variance_reduction import sweep_estimates
 
 
-def run_experiment_1(time_limit=2*604800, repeat=1, save_path='graphs'):
-    """Experiment 1 - estimates the maximum throughput of the system for different number of robots"""
+def run_experiment_1(time_limit=2*604800, save_path='graphs', seed=None, max_workers=None, show=True,
+                     pilot_time=2*86400, rel_tol=0.02, cache=None, export_dir=None, instability=True):
+    """
+    Experiment 1 - estimates the maximum throughput of the system for different number of robots.
+    With instability the runs above the capacity end once their backlog is confirmed to explode.
+    With a cache (the pilot runs of the capacity search and the long runs are cached) seed is required.
+    """
+    if cache is not None and seed is None:
+        raise ValueError('a cached experiment needs a seed - without one every call gets a fresh seed and never hits')
     # Params
     robot_nums = [2, 4, 10]
-    entering_rates = [0.025, 0.035, 0.08]
-    exp_res = []
-    for r in range(len(robot_nums)):
-        res = []
-        robot_num = robot_nums[r]
-        entering_rate = entering_rates[r]
-        print(f'Starting {robot_num}...')
-        for s in range(repeat):
-            simu_instance = Simulation(time_limit=time_limit, robot_num=robot_num, order_enter_rate=entering_rate)
-            simu_instance.run_simulation()
-            res.append(len(simu_instance.served_orders[simu_instance.served_orders_while_warmup:]))
-        exp_res.append((robot_num, np.mean(res)))
-
-    for res in exp_res:
-        before_exploding_rate = res[1] / (time_limit*(1-simu_instance.warmup_dur))
-        robot_num = res[0]
-        epsilon = 0.001
-        print(f'Starting {robot_num}...')
-        simu_instance_exp = Simulation(time_limit=time_limit, robot_num=robot_num,
-                                       order_enter_rate=before_exploding_rate + epsilon)
-        simu_instance_exp.run_simulation()
-        plt.plot(simu_instance_exp.times_lst, simu_instance_exp.order_cnt_lst,
-                 label=f'{np.round(before_exploding_rate, 3)} + epsilon')
-
-        simu_instance_no_exp = Simulation(time_limit=time_limit, robot_num=robot_num,
-                                          order_enter_rate=before_exploding_rate - epsilon)
-        simu_instance_no_exp.run_simulation()
-        plt.plot(simu_instance_no_exp.times_lst, simu_instance_no_exp.order_cnt_lst,
-                 label=f'{np.round(before_exploding_rate, 3)} - epsilon')
-        plt.xlabel('Time')
-        plt.ylabel('Number of Orders in the Warehouse')
-        plt.title(f'Entering Rates Before and After Explosion for {robot_num} Robots')
-        plt.legend()
-        plt.savefig(f'{save_path}/experiment1_num_robots_{robot_num}.png')
-        plt.show()
+    warmup_dur = 0.1
+    epsilon = 0.001
+    root_seed = np.random.SeedSequence(seed)
+    search_seed, explode_seed = root_seed.spawn(2)
+
+    # capacity search on short pilot runs, each robot number warm starts the next
+    exp_res = capacity_curve(robot_nums, seed=search_seed, pilot_time=pilot_time, rel_tol=rel_tol,
+                             warmup_dur=warmup_dur, progress=report_capacity, cache=cache)
+    before_exploding_rates = [res['capacity'] for res in exp_res]
+    cells = []
+    for res, before_exploding_rate in zip(exp_res, before_exploding_rates):
+        for sign in (1, -1):
+            # the trajectory is kept as min/max per bucket, so long runs plot at bounded memory
+            cells.append(dict(time_limit=time_limit, robot_num=res['robot_num'], warmup_dur=warmup_dur,
+                              order_enter_rate=before_exploding_rate + sign * epsilon,
+                              trajectory_mode='minmax', trajectory_step=time_limit / 5000))
+    explode_results = run_grid(cells, seed=explode_seed, max_workers=max_workers, with_trajectory=True,
+                               cache=cache, export_dir=export_dir, instability=instability, skip_dominated=False)
+
+    # the plotting stack is loaded only once there is something to plot
+    from reporting import plot_experiment_1
+    for r, res in enumerate(exp_res):
+        result_exp, result_no_exp = explode_results[2 * r], explode_results[2 * r + 1]
+        plot_experiment_1(res['robot_num'], before_exploding_rates[r], result_exp['times'], result_exp['order_cnt'],
+                          result_no_exp['times'], result_no_exp['order_cnt'], save_path=save_path, show=show)
     return exp_res
 
 
-def run_experiment_2(time_limit=2*604800, repeat=1, save_path='graphs'):
-    """Experiment 2 - estimates the service time of orders for different number of robots and enter rate"""
+def report_capacity(res):
+    low, high = res['bracket']
+    print(f'robot num = {res["robot_num"]} | capacity = {res["capacity"]:.5f} [{low:.5f}, {high:.5f}] orders per sec | '
+          f'{res["n_pilots"]} pilot runs')
+
+
+def run_experiment_2(time_limit=2*604800, repeat=1, save_path='graphs', seed=None, max_workers=None, show=True,
+                     cache=None, export_dir=None, common_random_numbers=True, antithetic=False, control_variate=True,
+                     instability=True):
+    """
+    Experiment 2 - estimates the service time of orders for different number of robots and enter rate.
+    By default the robot numbers of a rate are compared on common random numbers, see variance_reduction.py.
+    With instability, exploding runs end early and the robot numbers below an exploded one are not simulated;
+    their service time is nan (no steady state).
+    With a cache seed is required.
+    """
     # Params
     rates = [200.0 / (60*60), 500.0 / (60*60)]
     robot_ranges = [(1, 20), (15, 35)]
+    cells = []
+    for enter_rate, (min_robot, max_robot) in zip(rates, robot_ranges):
+        for robot_num in range(min_robot, max_robot + 1):
+            cells.append(dict(time_limit=time_limit, robot_num=robot_num, order_enter_rate=enter_rate))
+    sweep_results = run_grid(cells, repeat=repeat, seed=seed, max_workers=max_workers, cache=cache,
+                             export_dir=export_dir, common_random_numbers=common_random_numbers, antithetic=antithetic,
+                             instability=instability)
+    estimates = sweep_estimates(sweep_results, 'mean_sojourn', control_variate=control_variate)
+
+    from reporting import plot_experiment_2
     exp_results = []
     for i in range(len(rates)):
         enter_rate = rates[i]
-        min_robot, max_robot = robot_ranges[i]
         avg_lst = []
         r_num_lst = []
-        service_times = []
         std_times = []
-        for robot_num in range(min_robot, max_robot + 1):
-            print(f'enter rate = {enter_rate} | robot num = {robot_num} | Starting... ')
-            n_repeat = 0
-            for s in range(repeat):
-                n = 0
-                cum_sum = 0
-                simu_instance = Simulation(time_limit=time_limit, robot_num=robot_num, order_enter_rate=enter_rate)
-                simu_instance.run_simulation()
-
-                for order in simu_instance.served_orders[simu_instance.served_orders_while_warmup:]:
-                    service_time = order.o_exit_time - order.o_enter_time
-                    n += 1
-                    cum_sum += service_time
-                    service_times.append(service_time)
-                n_repeat += cum_sum / n
-
-            std_times.append(np.std(service_times))
-            avg_lst.append(n_repeat/repeat)
+        half_widths = []
+        rate_results = [result for result in sweep_results if result['order_enter_rate'] == enter_rate]
+        rate_estimates = [estimate for estimate in estimates if estimate['order_enter_rate'] == enter_rate]
+        for cell_ind, estimate in zip(range(0, len(rate_results), repeat), rate_estimates):
+            cell_results = rate_results[cell_ind:cell_ind + repeat]
+            robot_num = cell_results[0]['robot_num']
+            # service times of all the replications of this robot number
+            cell_stats = RunningStats()
+            for result in cell_results:
+                cell_stats.merge(RunningStats(result['n_served'], result['mean_sojourn'], result['m2_sojourn']))
+
+            # a diverging run has no steady state service time, nor its spread
+            std_times.append(float('nan') if estimate['unstable'] else cell_stats.std())
+            avg_lst.append(estimate['mean'])
+            half_widths.append(estimate['half_width'])
             r_num_lst.append(robot_num)
 
-        plt.scatter(r_num_lst, avg_lst, c='blue', label='Average')
-        for k in range(len(avg_lst)):
-            if k % 2 == 1:
-                continue
-            plt.annotate(str(np.round(avg_lst[k])), xy=(r_num_lst[k], avg_lst[k] + 10000))
-        # plt.plot(r_num_lst, np.array(avg_lst) + np.array(std_times), c='red', label='+SD')
-        # plt.plot(r_num_lst, np.array(avg_lst) - np.array(std_times), c='red', label='-SD')
-        plt.ylabel('Service Time')
-        plt.xlabel('Number of Robots')
-        plt.legend()
-        dur = np.round(time_limit / 60 / 60 / 24)
-        enter_rate_hour = np.round(enter_rate * 60 * 60)
-        plt.title(f'Experiment 2 - {dur} Days with Entering Rate of {enter_rate_hour} Orders per Hour')
-        plt.savefig(f'{save_path}/experiment2_{dur}_days_enterrate_{enter_rate_hour}.png')
-        plt.show()
-        exp_results.append((avg_lst, r_num_lst, std_times))
+        plot_experiment_2(time_limit, enter_rate, r_num_lst, avg_lst, save_path=save_path, show=show)
+        exp_results.append((avg_lst, r_num_lst, std_times, half_widths))
     return exp_results
 
 
+def replot_experiment_1(export_dir, save_path='graphs', show=True):
+    """Graphs of experiment 1 from the runs it exported to export_dir, without simulating"""
+    from reporting import plot_experiment_1
+    from run_export import load_runs
+    runs_by_robots = {}
+    for run in load_runs(export_dir):
+        runs_by_robots.setdefault(run.meta['robot_num'], []).append(run)
+    for robot_num, runs in sorted(runs_by_robots.items()):
+        run_no_exp, run_exp = sorted(runs, key=lambda run: run.meta['order_enter_rate'])
+        before_exploding_rate = (run_exp.meta['order_enter_rate'] + run_no_exp.meta['order_enter_rate']) / 2
+        times_exp, order_cnt_exp = run_exp.wip_trajectory()
+        times_no_exp, order_cnt_no_exp = run_no_exp.wip_trajectory()
+        plot_experiment_1(robot_num, before_exploding_rate, times_exp, order_cnt_exp, times_no_exp, order_cnt_no_exp,
+                          save_path=save_path, show=show)
+    return
+
+
+def replot_experiment_2(export_dir, save_path='graphs', show=True):
+    """Graphs of experiment 2 from the runs it exported to export_dir, without simulating"""
+    from reporting import plot_experiment_2
+    from run_export import load_runs
+    sojourn_by_cell = {}
+    time_limit = None
+    for run in load_runs(export_dir):
+        time_limit = run.meta['time_limit']
+        if run.instability is not None and run.instability['unstable']:
+            continue
+        cell = (run.meta['order_enter_rate'], run.meta['robot_num'])
+        sojourn_by_cell.setdefault(cell, []).append(run.sojourn_times().mean())
+    for enter_rate in sorted({rate for rate, _ in sojourn_by_cell}):
+        r_num_lst = sorted(robot_num for rate, robot_num in sojourn_by_cell if rate == enter_rate)
+        avg_lst = [np.mean(sojourn_by_cell[(enter_rate, robot_num)]) for robot_num in r_num_lst]
+        plot_experiment_2(time_limit, enter_rate, r_num_lst, avg_lst, save_path=save_path, show=show)
+    return
+
+
 if __name__ == '__main__':
-    exp1_results = run_experiment_1(repeat=5)
+    exp1_results = run_experiment_1()
     exp2_results = run_experiment_2(repeat=1)
 
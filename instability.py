@@ -0,0 +1,74 @@
+"""Detection of unstable runs - an order backlog that grows without bound.
+
+From its reference point (by default the first check after the warm-up) the detector tests the
+growth of the backlog at every check against what a stable run can show: a drift of at most
+drift_tol * order_enter_rate plus z standard deviations of a random walk with the arrival rate as
+the rate of both its up and down steps, i.e. growth > drift_tol * rate * dt + z * sqrt(2 * rate * dt).
+Divergence is confirmed after confirmations consecutive checks above the threshold; the growth
+rate is the least squares slope of the backlog since the reference point.
+"""
+import numpy as np
+
+
+class InstabilityDetector:
+    """
+    #### Backlog drift test of a running simulation, see Simulation.detect_instability
+    check() is called every check_interval of simulation time and returns True once the run
+    is confirmed unstable; result() has unstable, detection_time and growth_rate [orders / sec].
+    """
+    def __init__(self, check_interval, drift_tol=0.02, z=3.0, confirmations=3, start_time=None):
+        self.check_interval = check_interval
+        self.drift_tol = drift_tol
+        self.z = z
+        self.confirmations = confirmations
+        self.start_time = start_time
+        self.next_check = check_interval if start_time is None else max(start_time, check_interval)
+        self.ref_time = None
+        self.ref_backlog = 0
+        self.times = []
+        self.backlogs = []
+        self.n_exceeded = 0
+        self.unstable = False
+        self.detection_time = None
+
+    def is_started(self, simulation):
+        if self.start_time is None:
+            return simulation.stats.is_warm()
+        return simulation.curr_time >= self.start_time
+
+    def check(self, simulation):
+        curr_time = simulation.curr_time
+        while self.next_check <= curr_time:
+            self.next_check += self.check_interval
+        backlog = len(simulation.orders_in_sys_queue)
+        if self.ref_time is None:
+            if self.is_started(simulation):
+                self.ref_time = curr_time
+                self.ref_backlog = backlog
+                self.times.append(curr_time)
+                self.backlogs.append(backlog)
+            return False
+        self.times.append(curr_time)
+        self.backlogs.append(backlog)
+
+        elapsed = curr_time - self.ref_time
+        rate = simulation.order_enter_rate
+        threshold = self.drift_tol * rate * elapsed + self.z * np.sqrt(2 * rate * elapsed)
+        if backlog - self.ref_backlog > threshold:
+            self.n_exceeded += 1
+        else:
+            self.n_exceeded = 0
+        if self.n_exceeded >= self.confirmations:
+            self.unstable = True
+            self.detection_time = curr_time
+        return self.unstable
+
+    def growth_rate(self):
+        if len(self.times) < 2:
+            return float('nan')
+        times = np.asarray(self.times) - self.times[0]
+        backlogs = np.asarray(self.backlogs, dtype=float)
+        return float(np.polyfit(times, backlogs, 1)[0])
+
+    def result(self):
+        return {'unstable': self.unstable, 'detection_time': self.detection_time, 'growth_rate': self.growth_rate()}
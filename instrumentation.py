@@ -0,0 +1,95 @@
+import time
+from collections import Counter
+
+from event_calendar import EVENT_NAMES
+
+
+class Instrumentation:
+    """
+    #### Optional instrumentation of a simulation
+    Attached with Simulation.instrument(); until then the simulation runs its plain
+    event loop and pays nothing.
+    ##### collects
+    - counts / handler_sec - number of events and cumulative handler time per event type
+    - event_list_hist / backlog_hist - how many events saw each event list / order backlog length
+    - observers - callbacks called after every event with (event type, time, entity)
+    """
+    def __init__(self, profile=True, track_lengths=True, observers=()):
+        self.profile = profile
+        self.track_lengths = track_lengths
+        self.observers = list(observers)
+        self.counts = [0] * len(EVENT_NAMES)
+        self.handler_sec = [0.0] * len(EVENT_NAMES)
+        self.event_list_hist = Counter()
+        self.backlog_hist = Counter()
+        self.simulation = None
+
+    def add_observer(self, callback):
+        self.observers.append(callback)
+        return
+
+    def remove_observer(self, callback):
+        self.observers.remove(callback)
+        return
+
+    def attach(self, simulation):
+        self.simulation = simulation
+        # the instance attribute shadows Simulation.perform_curr_event
+        simulation.perform_curr_event = self.perform_curr_event
+        return
+
+    def detach(self):
+        if self.simulation is not None:
+            del self.simulation.perform_curr_event
+            self.simulation.instrumentation = None
+            self.simulation = None
+        return
+
+    def perform_curr_event(self):
+        simulation = self.simulation
+        event_calendar = simulation.event_calendar
+        if self.track_lengths:
+            self.event_list_hist[len(event_calendar)] += 1
+            self.backlog_hist[len(simulation.orders_in_sys_queue)] += 1
+
+        curr_event = event_calendar.next_event()
+        simulation.curr_time = curr_event.event_start
+        simulation.n_events += 1
+        event_type = curr_event.event_type
+        if self.profile:
+            start = time.perf_counter()
+            simulation.event_handlers[event_type](curr_event)
+            self.handler_sec[event_type] += time.perf_counter() - start
+        else:
+            simulation.event_handlers[event_type](curr_event)
+        self.counts[event_type] += 1
+
+        for callback in self.observers:
+            callback(event_type, simulation.curr_time, curr_event.event_obj)
+        return
+
+    def summary(self):
+        res = {'events': {}}
+        for event_type, name in enumerate(EVENT_NAMES):
+            count = self.counts[event_type]
+            res['events'][name] = {
+                'count': count,
+                'handler_sec': self.handler_sec[event_type],
+                'mean_handler_usec': 1e6 * self.handler_sec[event_type] / count if count else 0.0,
+            }
+        res['event_list_hist'] = sorted(self.event_list_hist.items())
+        res['backlog_hist'] = sorted(self.backlog_hist.items())
+        return res
+
+    def report(self):
+        total_sec = sum(self.handler_sec)
+        lines = [f'{"event type":24s} {"count":>10s} {"total sec":>10s} {"share":>7s} {"usec/event":>11s}']
+        for name, stats in self.summary()['events'].items():
+            share = stats['handler_sec'] / total_sec if total_sec else 0.0
+            lines.append(f'{name:24s} {stats["count"]:10d} {stats["handler_sec"]:10.3f} {share:7.1%} '
+                         f'{stats["mean_handler_usec"]:11.2f}')
+        if self.event_list_hist:
+            lines.append(f'event list length - max {max(self.event_list_hist)}')
+        if self.backlog_hist:
+            lines.append(f'order backlog length - max {max(self.backlog_hist)}')
+        return '\n'.join(lines)
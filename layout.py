@@ -0,0 +1,95 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+class WarehouseLayout:
+    """
+    #### Parameterized storage layout, built with NumPy
+    Storage blocks of block_width x block_depth spots (1 x 1 each). pa blocks along x are
+    separated by picking aisles of aisle_width, ca + 1 blocks along y by cross aisles of
+    cross_aisle_width; the first and last rows are half blocks against the walls. Every spot
+    holds one pod, pod p stands in spot p (spots are numbered row by row).
+    Workstations stand at ws_y in front of picking aisles spread evenly along the front,
+    unless ws_positions gives their (x, y).
+    The defaults are the layout of the M1 model: 12 x 12 blocks of 5 x 2, 1440 pods, 3 workstations.
+    ##### arrays
+    - col_x / row_y - x of every column, y of every row
+    - row_add_move - extra move (0 / 1) of a robot leaving a row for a workstation: 1 unless the row
+      is the first row of its block (the one facing the cross aisle towards the workstations)
+    - spot_xy - (rows, cols, 2) coordinates of the spots
+    - ws_xy - (workstations, 2) coordinates of the workstations
+    """
+    def __init__(self, pa=12, ca=11, block_width=5, block_depth=2, aisle_width=2.0, cross_aisle_width=2.0,
+                 x0=0.5, y0=2.5, n_workstations=3, ws_positions=None, ws_y=0.0):
+        if pa < 1 or ca < 0 or block_width < 1 or block_depth < 1:
+            raise ValueError(f'Invalid layout pa={pa} ca={ca} block {block_width}x{block_depth}')
+        self.pa = pa
+        self.ca = ca
+        self.block_width = block_width
+        self.block_depth = block_depth
+        self.aisle_width = aisle_width
+        self.cross_aisle_width = cross_aisle_width
+        self.n_rows = (ca + 1) * block_depth
+        self.n_cols = pa * block_width
+
+        cols = np.arange(self.n_cols)
+        rows = np.arange(self.n_rows)
+        self.col_x = x0 + cols + (cols // block_width) * aisle_width
+        self.row_y = y0 + rows + ((rows + block_depth // 2) // block_depth) * cross_aisle_width
+        self.row_add_move = ((rows + block_depth // 2) % block_depth != 0).astype(float)
+        self.spot_xy = np.empty((self.n_rows, self.n_cols, 2))
+        self.spot_xy[:, :, 0] = self.col_x[None, :]
+        self.spot_xy[:, :, 1] = self.row_y[:, None]
+
+        if ws_positions is None:
+            ws_positions = self.aisle_front_positions(n_workstations, ws_y)
+        self.ws_xy = np.array(ws_positions, dtype=float).reshape(-1, 2)
+
+    @property
+    def n_spots(self):
+        return self.n_rows * self.n_cols
+
+    def add_move(self, y):
+        """Extra move out of the row nearest to y - for points that are not a storage spot"""
+        return float(self.row_add_move[np.abs(self.row_y - y).argmin()])
+
+    def aisle_x(self, aisle):
+        # middle of the picking aisle after block number aisle
+        last_x = self.col_x[(aisle + 1) * self.block_width - 1]
+        return float(last_x + (self.aisle_width + 1) / 2)
+
+    def aisle_front_positions(self, n_workstations, ws_y):
+        n_aisles = self.pa - 1
+        if n_aisles == 0:
+            xs = np.full(n_workstations, (self.col_x[0] + self.col_x[-1]) / 2)
+        elif n_workstations == 1:
+            xs = [self.aisle_x((n_aisles - 1) // 2)]
+        else:
+            aisles = np.round(np.arange(n_workstations) * (n_aisles - 1) / (n_workstations - 1)).astype(int)
+            xs = [self.aisle_x(aisle) for aisle in aisles]
+        return [(float(x), ws_y) for x in xs]
+
+
+@lru_cache(maxsize=1)
+def default_layout():
+    # for robots outside of a warehouse, see Robot.assign_robot_to_workstation
+    return WarehouseLayout()
+
+
+def assign_items_to_pods(n_pods, number_of_types, permutation, items_per_pod=1):
+    """
+    Spreads the item types over the pods: each type gets the same number of pod slots
+    (n_pods * items_per_pod // number_of_types) in a random permutation, so every item is
+    in several pods and with items_per_pod > 1 every pod holds several items.
+    permutation(n) is the random permutation source (the layout random stream).
+    Returns the pods of every item type (arrays, duplicates removed) and the slots per type.
+    """
+    n_slots = n_pods * items_per_pod
+    slots_per_type = n_slots // number_of_types
+    pods = permutation(n_slots) % n_pods
+    item_pods = pods[:slots_per_type * number_of_types].reshape(number_of_types, slots_per_type)
+    if items_per_pod == 1:
+        return list(item_pods), slots_per_type
+    # a pod may get the same item twice, keep the first
+    return [row[np.sort(np.unique(row, return_index=True)[1])] for row in item_pods], slots_per_type
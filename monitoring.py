@@ -0,0 +1,56 @@
+"""asyncio wrappers to watch running simulations.
+
+    async for sim_ind, snapshot in watch_simulations(simulations, interval=3600):
+        print(sim_ind, snapshot['time'], snapshot['wip'])
+
+Every simulation advances slice by slice (Simulation.run_until) in a worker thread, so the event
+loop stays free for the monitoring code while the simulations run, and a consumer that stops
+iterating stops the simulations after their current slice.
+"""
+import asyncio
+
+
+async def async_snapshots(simulation, interval, until_time=None, executor=None):
+    """Async generator of the snapshots of simulation, one every interval of simulation time"""
+    loop = asyncio.get_running_loop()
+    stop_time = simulation.time_limit if until_time is None else min(until_time, simulation.time_limit)
+    next_time = simulation.curr_time + interval
+    while simulation.curr_time < stop_time and not simulation.is_finished():
+        await loop.run_in_executor(executor, simulation.run_until, min(next_time, stop_time))
+        next_time += interval
+        yield simulation.snapshot()
+
+
+async def watch_simulations(simulations, interval, until_time=None, executor=None):
+    """
+    Async generator of (simulation index, snapshot) from several simulations advanced concurrently,
+    in the order the snapshots are taken
+    """
+    queue = asyncio.Queue()
+    done = object()
+
+    async def feed(sim_ind, simulation):
+        try:
+            async for snapshot in async_snapshots(simulation, interval, until_time, executor):
+                await queue.put((sim_ind, snapshot))
+        except Exception as exc:
+            # handed to the consumer
+            await queue.put(exc)
+        finally:
+            await queue.put(done)
+
+    tasks = [asyncio.ensure_future(feed(sim_ind, simulation)) for sim_ind, simulation in enumerate(simulations)]
+    try:
+        n_running = len(tasks)
+        while n_running:
+            item = await queue.get()
+            if item is done:
+                n_running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
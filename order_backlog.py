@@ -0,0 +1,56 @@
+import heapq
+from collections import deque
+from itertools import count
+
+
+class OrderBacklog:
+    """
+    #### Orders waiting in the system for a robot or a pod
+    Orders are kept in a FIFO deque per item type, tagged with a global arrival
+    sequence number. The oldest order whose item satisfies a condition is found by
+    comparing the heads of the non empty deques only, so it costs time proportional to
+    the number of item types in the backlog and not to its length.
+    """
+    def __init__(self):
+        self.item_queues = {}
+        self.seq = count()
+        self.n_orders = 0
+
+    def __len__(self):
+        return self.n_orders
+
+    def __iter__(self):
+        # orders in global arrival order
+        for _, order_obj in heapq.merge(*self.item_queues.values(), key=lambda entry: entry[0]):
+            yield order_obj
+
+    def append(self, order_obj):
+        item_queue = self.item_queues.get(order_obj.o_item)
+        if item_queue is None:
+            item_queue = deque()
+            self.item_queues[order_obj.o_item] = item_queue
+        item_queue.append((next(self.seq), order_obj))
+        self.n_orders += 1
+        return
+
+    def count_item(self, item_type):
+        item_queue = self.item_queues.get(item_type)
+        return 0 if item_queue is None else len(item_queue)
+
+    def pop_oldest(self, is_item_available):
+        """Removes and returns the oldest order which is_item_available(item type) is True for, else None"""
+        best_item = None
+        best_seq = None
+        for item_type, item_queue in self.item_queues.items():
+            head_seq = item_queue[0][0]
+            if (best_seq is None or head_seq < best_seq) and is_item_available(item_type):
+                best_item = item_type
+                best_seq = head_seq
+        if best_item is None:
+            return None
+        item_queue = self.item_queues[best_item]
+        order_obj = item_queue.popleft()[1]
+        if not item_queue:
+            del self.item_queues[best_item]
+        self.n_orders -= 1
+        return order_obj
@@ -0,0 +1,165 @@
+import math
+
+import numpy as np
+
+
+def bisect_increasing(func, target, low, high, n_iter=100):
+    """x in [low, high] with func(x) = target, for an increasing func"""
+    for _ in range(n_iter):
+        mid = (low + high) / 2
+        if func(mid) < target:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def normal_quantile(p):
+    """Standard normal quantile - the normal distribution (math.erfc) inverted by bisection"""
+    return bisect_increasing(lambda z: 0.5 * math.erfc(-z / math.sqrt(2)), p, -40.0, 40.0)
+
+
+def t_central_prob(theta, dof):
+    """P(|T| < sqrt(dof) * tan(theta)) for a Student t with an integer dof - the closed form series"""
+    cos2 = math.cos(theta) ** 2
+    term, total = 1.0, 1.0
+    if dof % 2 == 0:
+        for k in range(1, dof // 2):
+            term *= cos2 * (2 * k - 1) / (2 * k)
+            total += term
+        return math.sin(theta) * total
+    if dof == 1:
+        return 2 * theta / math.pi
+    for k in range(1, (dof - 1) // 2):
+        term *= cos2 * (2 * k) / (2 * k + 1)
+        total += term
+    return 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * total)
+
+
+def t_quantile(p, dof):
+    """
+    Student t quantile - exact (closed form distribution inverted by bisection) for dof < 30,
+    Cornish-Fisher expansion around the normal quantile from dof 30
+    """
+    if dof < 30:
+        if p < 0.5:
+            return -t_quantile(1 - p, dof)
+        theta = bisect_increasing(lambda angle: t_central_prob(angle, int(dof)), 2 * p - 1, 0.0, math.pi / 2)
+        return math.sqrt(dof) * math.tan(theta)
+    z = normal_quantile(p)
+    return (z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2) +
+            (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+def mser_truncation(batch_means):
+    """MSER truncation point (in batches) - minimizes the marginal standard error over the first half"""
+    y = np.asarray(batch_means, dtype=float)
+    n = len(y)
+    if n < 4:
+        return 0
+    # suffix sums of the batch means and their squares
+    s1 = np.cumsum(y[::-1])[::-1]
+    s2 = np.cumsum((y * y)[::-1])[::-1]
+    m = n - np.arange(n)
+    sse = s2 - s1 * s1 / m
+    mser = sse / (m * m)
+    return int(np.argmin(mser[:n // 2]))
+
+
+def batch_means_ci(values, n_batches=20, confidence=0.95):
+    """Mean and confidence interval half width of a series by the method of batch means"""
+    y = np.asarray(values, dtype=float)
+    batch_size = len(y) // n_batches
+    if batch_size == 0:
+        return float(y.mean()) if len(y) else float('nan'), float('inf')
+    # the remainder is dropped from the start of the series
+    batches = y[len(y) - batch_size * n_batches:].reshape(n_batches, batch_size).mean(axis=1)
+    half_width = t_quantile(0.5 + confidence / 2, n_batches - 1) * batches.std(ddof=1) / np.sqrt(n_batches)
+    return float(batches.mean()), float(half_width)
+
+
+class BatchSeries:
+    """
+    #### Streaming series of batch means in bounded memory
+    Observations are averaged in batches of batch_size; when max_batches batches are kept,
+    neighbouring batches are merged and the batch size doubles. The time of the last
+    observation of every batch is kept too.
+    """
+    def __init__(self, batch_size=5, max_batches=4096):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.means = []
+        self.end_times = []
+        self.n_obs = 0
+        self.acc_sum = 0.0
+        self.acc_n = 0
+
+    def add(self, x, curr_time):
+        self.n_obs += 1
+        self.acc_sum += x
+        self.acc_n += 1
+        if self.acc_n == self.batch_size:
+            self.means.append(self.acc_sum / self.acc_n)
+            self.end_times.append(curr_time)
+            self.acc_sum = 0.0
+            self.acc_n = 0
+            if len(self.means) == self.max_batches:
+                self.merge()
+        return
+
+    def merge(self):
+        means = np.array(self.means)
+        self.means = ((means[0::2] + means[1::2]) / 2).tolist()
+        self.end_times = self.end_times[1::2]
+        self.batch_size *= 2
+        return
+
+
+class OutputAnalyzer:
+    """
+    #### Output analysis of a running simulation
+    Fed with every finished order (sojourn time) and with the completion times (throughput per
+    time interval). analyze() finds the MSER-5 warm-up truncation point of each series and
+    a batch means confidence interval of the mean of the rest.
+    """
+    def __init__(self, throughput_interval=3600.0, n_batches=20, confidence=0.95):
+        self.sojourn = BatchSeries(batch_size=5)
+        self.throughput = BatchSeries(batch_size=1)
+        self.throughput_interval = throughput_interval
+        self.interval_end = throughput_interval
+        self.interval_count = 0
+        self.n_batches = n_batches
+        self.confidence = confidence
+
+    def close_intervals(self, curr_time):
+        while curr_time >= self.interval_end:
+            self.throughput.add(self.interval_count / self.throughput_interval, self.interval_end)
+            self.interval_count = 0
+            self.interval_end += self.throughput_interval
+        return
+
+    def order_finished(self, sojourn_time, curr_time):
+        self.close_intervals(curr_time)
+        self.interval_count += 1
+        self.sojourn.add(sojourn_time, curr_time)
+        return
+
+    def analyze_series(self, series):
+        res = {'n_obs': series.n_obs, 'batch_size': series.batch_size}
+        if len(series.means) < 2 * self.n_batches:
+            res.update(mean=float('nan'), half_width=float('inf'), rel_half_width=float('inf'),
+                       truncation_obs=0, truncation_time=0.0)
+            return res
+        d = mser_truncation(series.means)
+        mean, half_width = batch_means_ci(series.means[d:], self.n_batches, self.confidence)
+        res.update(mean=mean, half_width=half_width,
+                   rel_half_width=half_width / abs(mean) if mean != 0 else float('inf'),
+                   truncation_obs=d * series.batch_size,
+                   truncation_time=series.end_times[d - 1] if d > 0 else 0.0)
+        return res
+
+    def analyze(self, curr_time=None):
+        if curr_time is not None:
+            self.close_intervals(curr_time)
+        return {'sojourn': self.analyze_series(self.sojourn), 'throughput': self.analyze_series(self.throughput),
+                'confidence': self.confidence}
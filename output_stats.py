@@ -0,0 +1,187 @@
+import math
+
+
+class RunningStats:
+    """
+    #### Welford running mean and variance
+    Keeps count, mean and sum of squared deviations (m2) in O(1) memory. Two
+    accumulators can be merged, e.g. to pool replications.
+    """
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        return
+
+    def merge(self, other):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        return
+
+    def variance(self):
+        if self.n < 2:
+            return float('nan')
+        return self.m2 / (self.n - 1)
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+
+class P2Quantile:
+    """
+    #### P-square streaming quantile estimator
+    Jain & Chlamtac (1985) - estimates the p quantile from five markers, in O(1)
+    memory and time per observation.
+    """
+    def __init__(self, p):
+        self.p = p
+        self.n = 0
+        self.heights = []
+        self.pos = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.incr = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.n += 1
+        q = self.heights
+        if self.n <= 5:
+            q.append(x)
+            if self.n == 5:
+                q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        pos = self.pos
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            self.desired[i] += self.incr[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                q_new = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i]) +
+                    (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not q[i - 1] < q_new < q[i + 1]:
+                    # parabolic prediction out of order, use linear one
+                    q_new = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = q_new
+                pos[i] += d
+        return
+
+    def value(self):
+        if self.n == 0:
+            return float('nan')
+        if self.n <= 5:
+            sample = sorted(self.heights)
+            return sample[min(int(self.p * len(sample)), len(sample) - 1)]
+        return self.heights[2]
+
+
+class TimeWeightedStat:
+    """
+    #### Time weighted average of a piecewise constant quantity (e.g. WIP)
+    """
+    def __init__(self, start_time=0.0, value=0.0):
+        self.start_time = start_time
+        self.last_time = start_time
+        self.value = value
+        self.area = 0.0
+
+    def update(self, curr_time, new_value):
+        self.area += self.value * (curr_time - self.last_time)
+        self.last_time = curr_time
+        self.value = new_value
+        return
+
+    def mean(self, curr_time):
+        duration = curr_time - self.start_time
+        if duration <= 0:
+            return float(self.value)
+        return (self.area + self.value * (curr_time - self.last_time)) / duration
+
+
+class StatisticsCollector:
+    """
+    #### Streaming output statistics of a simulation
+    Updated by the event handlers as orders arrive and finish. Until end_warmup is
+    called only the counters are updated; afterwards the sojourn time mean, variance
+    and quantiles and the time weighted WIP are collected too.
+    """
+    def __init__(self, quantiles=(0.5, 0.9, 0.95, 0.99)):
+        self.n_arrived = 0
+        self.n_served = 0
+        self.n_served_warmup = 0
+        self.n_arrived_warmup = 0
+        self.wip = 0
+        self.warmup_time = None
+        self.sojourn = RunningStats()
+        self.sojourn_quantiles = [P2Quantile(p) for p in quantiles]
+        self.wip_avg = None
+
+    def is_warm(self):
+        return self.warmup_time is not None
+
+    def end_warmup(self, curr_time):
+        self.warmup_time = curr_time
+        self.n_served_warmup = self.n_served
+        self.n_arrived_warmup = self.n_arrived
+        self.wip_avg = TimeWeightedStat(curr_time, self.wip)
+        return
+
+    def order_arrived(self, curr_time):
+        self.n_arrived += 1
+        self.wip += 1
+        if self.wip_avg is not None:
+            self.wip_avg.update(curr_time, self.wip)
+        return
+
+    def order_finished(self, order_obj, curr_time):
+        self.n_served += 1
+        self.wip -= 1
+        if self.wip_avg is not None:
+            self.wip_avg.update(curr_time, self.wip)
+            sojourn_time = order_obj.o_exit_time - order_obj.o_enter_time
+            self.sojourn.add(sojourn_time)
+            for estimator in self.sojourn_quantiles:
+                estimator.add(sojourn_time)
+        return
+
+    def summary(self, curr_time):
+        res = {
+            'n_arrived': self.n_arrived,
+            'n_served': self.n_served - self.n_served_warmup,
+            'n_served_warmup': self.n_served_warmup,
+            'n_arrived_warmup': self.n_arrived_warmup,
+            'warmup_time': self.warmup_time,
+            'mean_sojourn': self.sojourn.mean if self.sojourn.n else float('nan'),
+            'var_sojourn': self.sojourn.variance(),
+            'm2_sojourn': self.sojourn.m2,
+            'mean_wip': self.wip_avg.mean(curr_time) if self.wip_avg is not None else float('nan'),
+            'wip': self.wip,
+        }
+        for estimator in self.sojourn_quantiles:
+            res[f'q{int(round(estimator.p * 100))}_sojourn'] = estimator.value()
+        return res
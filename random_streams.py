@@ -0,0 +1,136 @@
+import numpy as np
+
+STREAM_NAMES = ('interarrival', 'item_type', 'pod_choice', 'picking_time', 'spot_choice', 'ws_fallback', 'layout')
+
+
+def spawn_seeds(seed_seq, n_children):
+    """
+    The first n_children children of seed_seq - like seed_seq.spawn(n_children) on a fresh one, but derived
+    explicitly, so seed_seq is not changed and a SeedSequence passed twice gives the same children
+    """
+    return [np.random.SeedSequence(seed_seq.entropy, spawn_key=seed_seq.spawn_key + (child_ind,),
+                                   pool_size=seed_seq.pool_size)
+            for child_ind in range(n_children)]
+
+
+class RandomStream:
+    """
+    #### Buffered random stream
+    Draws blocks of standard exponential / uniform values from its own
+    numpy.random.Generator and hands them out one by one, refilling a block only
+    when it runs out.
+    With antithetic, every value is the antithetic of the one the same generator gives
+    otherwise: 1 - u for a uniform u, and for an exponential the one whose uniform is 1 - u.
+    """
+    def __init__(self, generator, block_size=65536, antithetic=False):
+        self.generator = generator
+        self.block_size = block_size
+        self.antithetic = antithetic
+        self.exp_block = []
+        self.exp_pos = 0
+        self.unif_block = []
+        self.unif_pos = 0
+        # generator states the current blocks were drawn from, so a checkpoint can draw them again
+        self.exp_state = None
+        self.unif_state = None
+
+    def exponential(self, scale=1.0):
+        if self.exp_pos == len(self.exp_block):
+            self.exp_state = self.generator.bit_generator.state
+            self.exp_block = self.draw_block(self.generator, 'standard_exponential')
+            self.exp_pos = 0
+        value = self.exp_block[self.exp_pos]
+        self.exp_pos += 1
+        return value * scale
+
+    def random(self):
+        if self.unif_pos == len(self.unif_block):
+            self.unif_state = self.generator.bit_generator.state
+            self.unif_block = self.draw_block(self.generator, 'random')
+            self.unif_pos = 0
+        value = self.unif_block[self.unif_pos]
+        self.unif_pos += 1
+        return value
+
+    def integers(self, high):
+        # uniform integer in [0, high)
+        return int(self.random() * high)
+
+    def choice(self, seq):
+        return seq[self.integers(len(seq))]
+
+    def permutation(self, n):
+        return self.generator.permutation(n)
+
+    def reseed(self, generator):
+        self.generator = generator
+        self.exp_block = []
+        self.exp_pos = 0
+        self.unif_block = []
+        self.unif_pos = 0
+        self.exp_state = None
+        self.unif_state = None
+        return
+
+    def draw_block(self, generator, method):
+        block = getattr(generator, method)(self.block_size)
+        if self.antithetic:
+            if method == 'random':
+                # 1 - u is in (0, 1], keep it below 1 so integers() stays in range
+                block = np.minimum(1.0 - block, np.nextafter(1.0, 0.0))
+            else:
+                # exp(-e) is the uniform behind e
+                block = -np.log(-np.expm1(-np.maximum(block, np.finfo(float).tiny)))
+        return block.tolist()
+
+    def redraw_block(self, state, method):
+        generator = np.random.Generator(type(self.generator.bit_generator)())
+        generator.bit_generator.state = state
+        return self.draw_block(generator, method)
+
+    def __getstate__(self):
+        # the buffered blocks are not saved, they are drawn again from the saved generator states
+        state = dict(self.__dict__)
+        state['exp_block'] = len(self.exp_block)
+        state['unif_block'] = len(self.unif_block)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.exp_block = self.redraw_block(self.exp_state, 'standard_exponential') if self.exp_block else []
+        self.unif_block = self.redraw_block(self.unif_state, 'random') if self.unif_block else []
+
+
+class RandomStreams:
+    """
+    #### Independent named random streams of a simulation
+    - interarrival - time between orders
+    - item_type - item of a new order
+    - pod_choice - pod selected out of the available pods
+    - picking_time - picking duration at the workstation
+    - spot_choice - empty spot selected for storing a pod
+    - ws_fallback - workstation sampled when none is free
+    - layout - assignment of items to pods
+    The same seed (an int, a sequence of ints or a SeedSequence) always gives the
+    same streams. With antithetic the streams give the antithetic values of the same
+    seed (see RandomStream), except layout, so an antithetic pair shares its warehouse.
+    """
+    def __init__(self, seed=None, block_size=65536, antithetic=False):
+        self.block_size = block_size
+        self.antithetic = antithetic
+        for name, generator in zip(STREAM_NAMES, self.make_generators(seed)):
+            setattr(self, name, RandomStream(generator, block_size, antithetic=antithetic and name != 'layout'))
+
+    def make_generators(self, seed):
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_seq = seed
+        else:
+            self.seed_seq = np.random.SeedSequence(seed)
+        self.seed = seed if seed is not None else self.seed_seq.entropy
+        return [np.random.default_rng(child) for child in spawn_seeds(self.seed_seq, len(STREAM_NAMES))]
+
+    def reseed(self, seed=None):
+        """New seed for all the streams - the stream objects (shared with the warehouse) are kept"""
+        for name, generator in zip(STREAM_NAMES, self.make_generators(seed)):
+            getattr(self, name).reseed(generator)
+        return
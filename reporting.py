@@ -0,0 +1,40 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+def finish_figure(save_file, show):
+    plt.savefig(save_file)
+    if show:
+        plt.show()
+    else:
+        plt.close()
+
+
+def plot_experiment_1(robot_num, before_exploding_rate, times_exp, order_cnt_exp, times_no_exp, order_cnt_no_exp,
+                      save_path='graphs', show=True):
+    """Number of orders in the warehouse over time, just above and just below the exploding rate"""
+    plt.plot(times_exp, order_cnt_exp, label=f'{np.round(before_exploding_rate, 3)} + epsilon')
+    plt.plot(times_no_exp, order_cnt_no_exp, label=f'{np.round(before_exploding_rate, 3)} - epsilon')
+    plt.xlabel('Time')
+    plt.ylabel('Number of Orders in the Warehouse')
+    plt.title(f'Entering Rates Before and After Explosion for {robot_num} Robots')
+    plt.legend()
+    finish_figure(f'{save_path}/experiment1_num_robots_{robot_num}.png', show)
+
+
+def plot_experiment_2(time_limit, enter_rate, r_num_lst, avg_lst, save_path='graphs', show=True):
+    """Average service time per number of robots, for a single entering rate"""
+    plt.scatter(r_num_lst, avg_lst, c='blue', label='Average')
+    for k in range(len(avg_lst)):
+        if k % 2 == 1:
+            continue
+        plt.annotate(str(np.round(avg_lst[k])), xy=(r_num_lst[k], avg_lst[k] + 10000))
+    # plt.plot(r_num_lst, np.array(avg_lst) + np.array(std_times), c='red', label='+SD')
+    # plt.plot(r_num_lst, np.array(avg_lst) - np.array(std_times), c='red', label='-SD')
+    plt.ylabel('Service Time')
+    plt.xlabel('Number of Robots')
+    plt.legend()
+    dur = np.round(time_limit / 60 / 60 / 24)
+    enter_rate_hour = np.round(enter_rate * 60 * 60)
+    plt.title(f'Experiment 2 - {dur} Days with Entering Rate of {enter_rate_hour} Orders per Hour')
+    finish_figure(f'{save_path}/experiment2_{dur}_days_enterrate_{enter_rate_hour}.png', show)
@@ -0,0 +1,183 @@
+"""Disk cache of simulation run results.
+
+A run is keyed by a hash of its full scenario - the Simulation / Warehouse parameters, the seed
+and the code version (a hash of the sources of the simulation modules), so a changed model never
+hits an old result. Every entry is one pickle file, written to a temporary file and renamed into
+place, so parallel workers and concurrent sweeps can share a cache directory: a reader sees a
+whole entry or none. Per-order records are kept next to the entry as an .npz file, written before
+the pickle, so an entry is complete once its pickle exists. Hits refresh the file time and the least
+recently used entries are evicted once the cache is above max_bytes; eviction also removes the
+records and temporary files left without an entry (by a writer that died) for ORPHAN_AGE seconds.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from functools import lru_cache
+
+import numpy as np
+
+CACHE_FORMAT = 1
+# age [sec] after which a records or temporary file without an entry is removed - younger ones may be
+# an entry being written
+ORPHAN_AGE = 3600
+# modules whose code changes the results of a run
+CORE_MODULES = ('simulation.py', 'system_objects.py', 'event_calendar.py', 'order_backlog.py', 'random_streams.py',
+                'output_stats.py', 'output_analysis.py', 'trajectory.py', 'layout.py', 'utilis.py',
+                'experiment_runner.py', 'instability.py', 'capacity_search.py')
+
+
+@lru_cache(maxsize=1)
+def code_version():
+    digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in CORE_MODULES:
+        with open(os.path.join(base_dir, name), 'rb') as f:
+            digest.update(name.encode())
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def canonical(obj):
+    if isinstance(obj, np.random.SeedSequence):
+        return {'entropy': obj.entropy, 'spawn_key': list(obj.spawn_key)}
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} can not be part of a cache key')
+
+
+def scenario_key(cell_params, seed, **options):
+    """Hash of a run - its parameters, seed, run options (e.g. with_trajectory) and the code version"""
+    scenario = {'params': cell_params, 'seed': seed, 'options': options, 'version': code_version()}
+    return hashlib.sha256(json.dumps(scenario, sort_keys=True, default=canonical).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    #### Size bounded LRU cache of run results on local disk
+    - get / put - summary results by key (see scenario_key), with_orders also the per-order records
+    - get_orders - the per-order records stored with the entry, if any
+    - invalidate / clear - remove one entry / all the entries
+    """
+    def __init__(self, path='.sim_cache', max_bytes=2 ** 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def orders_path(self, key):
+        return os.path.join(self.path, key + '.orders.npz')
+
+    def atomic_write(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return
+
+    def get(self, key, with_orders=False):
+        """Result of key or None - with_orders, the result has the per-order records in 'orders' or is None"""
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            if with_orders:
+                result['orders'] = self.get_orders(key)
+                if result['orders'] is None:
+                    raise FileNotFoundError(self.orders_path(key))
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            # missing, evicted by another process meanwhile, or written by an older format
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def get_orders(self, key):
+        try:
+            with np.load(self.orders_path(key)) as data:
+                return {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, result, orders=None):
+        # the pickle last - it makes the entry visible
+        if orders is not None:
+            self.atomic_write(self.orders_path(key), lambda f: np.savez(f, **orders))
+        self.atomic_write(self.entry_path(key), lambda f: pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+        return
+
+    def invalidate(self, key):
+        for path in (self.entry_path(key), self.orders_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return
+
+    def clear(self):
+        for key in self.keys():
+            self.invalidate(key)
+        return
+
+    def keys(self):
+        return [name[:-len('.pkl')] for name in os.listdir(self.path) if name.endswith('.pkl')]
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def entries(self):
+        """(key, bytes, last use time) of every entry"""
+        res = []
+        for key in self.keys():
+            try:
+                stat = os.stat(self.entry_path(key))
+                size = stat.st_size
+                if os.path.exists(self.orders_path(key)):
+                    size += os.path.getsize(self.orders_path(key))
+            except FileNotFoundError:
+                # removed by another process meanwhile
+                continue
+            res.append((key, size, stat.st_mtime))
+        return res
+
+    def remove_orphans(self, now):
+        keys = set(self.keys())
+        for name in os.listdir(self.path):
+            is_orphan = name.endswith('.orders.npz') and name[:-len('.orders.npz')] not in keys
+            if not (is_orphan or name.endswith('.tmp')):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                if now - os.path.getmtime(path) > ORPHAN_AGE:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+        return
+
+    def evict(self):
+        self.remove_orphans(time.time())
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for key, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            self.invalidate(key)
+            total -= size
+            if total <= self.max_bytes:
+                break
+        return
@@ -0,0 +1,170 @@
+"""Columnar export of simulation runs and loading them back for analysis / plotting.
+
+A run directory holds one raw binary file per column and a manifest.json with the column
+dtypes, the number of rows and the run parameters:
+- orders.<column> - one row per order: enter_time, exit_time, item, robot, workstation, pod
+  (orders still in the warehouse at the end have exit_time nan and robot / workstation / pod -1)
+- events.<column> - optional trace of every event: time, event_type, robot (-1 for an order arrival),
+  wip and backlog after the event
+Rows are buffered in NumPy arrays of chunk_size and appended to the files chunk by chunk
+during the run. Raw column files (not .npz) are used so load_run can memory map them.
+"""
+import json
+import os
+
+import numpy as np
+
+from event_calendar import ORDER
+
+ORDER_COLUMNS = {'enter_time': 'f8', 'exit_time': 'f8', 'item': 'i8', 'robot': 'i4', 'workstation': 'i4',
+                 'pod': 'i8'}
+EVENT_COLUMNS = {'time': 'f8', 'event_type': 'i1', 'robot': 'i4', 'wip': 'i8', 'backlog': 'i8'}
+MANIFEST = 'manifest.json'
+
+
+class ChunkedColumnWriter:
+    """
+    #### Table written column by column in chunks
+    append() fills preallocated chunk arrays; a full chunk is appended to the column files.
+    """
+    def __init__(self, directory, table, columns, chunk_size=65536):
+        self.directory = directory
+        self.table = table
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.chunk = {name: np.empty(chunk_size, dtype=dtype) for name, dtype in columns.items()}
+        self.chunk_rows = 0
+        self.n_rows = 0
+        for name in columns:
+            open(self.column_path(name), 'wb').close()
+
+    def column_path(self, name):
+        return os.path.join(self.directory, f'{self.table}.{name}')
+
+    def append(self, *values):
+        row = self.chunk_rows
+        for column, value in zip(self.chunk.values(), values):
+            column[row] = value
+        self.chunk_rows += 1
+        if self.chunk_rows == self.chunk_size:
+            self.write_chunk()
+        return
+
+    def write_chunk(self):
+        for name, column in self.chunk.items():
+            with open(self.column_path(name), 'ab') as f:
+                column[:self.chunk_rows].tofile(f)
+        self.n_rows += self.chunk_rows
+        self.chunk_rows = 0
+        return
+
+    def manifest(self):
+        return {'columns': self.columns, 'n_rows': self.n_rows}
+
+
+class RunExporter:
+    """
+    #### Streams the orders (and optionally the events) of a simulation to a run directory
+    Attached with Simulation.export_to(); finish() writes the orders still in the warehouse
+    and the manifest.
+    """
+    def __init__(self, directory, event_trace=False, chunk_size=65536, meta=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.meta = dict(meta or {})
+        self.orders = ChunkedColumnWriter(directory, 'orders', ORDER_COLUMNS, chunk_size)
+        self.events = ChunkedColumnWriter(directory, 'events', EVENT_COLUMNS, chunk_size) if event_trace else None
+        self.simulation = None
+        self.finished = False
+
+    def order_finished(self, order_obj, robot_obj, curr_time):
+        self.orders.append(order_obj.o_enter_time, curr_time, order_obj.o_item, robot_obj.r_id, robot_obj.r_ws,
+                           robot_obj.r_occupied)
+        return
+
+    def record_event(self, event_type, curr_time, event_obj):
+        # an Instrumentation observer
+        simulation = self.simulation
+        self.events.append(curr_time, event_type, -1 if event_type == ORDER else event_obj.r_id,
+                           simulation.stats.wip, len(simulation.orders_in_sys_queue))
+        return
+
+    def finish(self, simulation):
+        if self.finished:
+            return
+        self.finished = True
+        # orders in the backlog or with a robot
+        for order_obj in simulation.orders_in_sys_queue:
+            self.orders.append(order_obj.o_enter_time, np.nan, order_obj.o_item, -1, -1, -1)
+        for robot in simulation.warehouse.robot_list:
+            order_obj = robot.r_order
+            if order_obj is not None and order_obj.o_status == 'wip':
+                self.orders.append(order_obj.o_enter_time, np.nan, order_obj.o_item, -1, -1, -1)
+        self.orders.write_chunk()
+        manifest = {'meta': self.meta, 'end_time': float(simulation.curr_time),
+                    'warmup_time': simulation.stats.warmup_time, 'orders': self.orders.manifest()}
+        if simulation.instability_detector is not None:
+            manifest['instability'] = simulation.instability_detector.result()
+        if self.events is not None:
+            self.events.write_chunk()
+            manifest['events'] = self.events.manifest()
+        with open(os.path.join(self.directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        return
+
+
+class RunRecords:
+    """
+    #### A stored run, columns memory mapped
+    - meta / end_time / warmup_time - from the manifest
+    - instability - the InstabilityDetector result of the run, None if it was not watched
+    - orders / events - dicts of column name to a read only memory mapped array (events is None if not traced)
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.meta = manifest['meta']
+        self.end_time = manifest['end_time']
+        self.warmup_time = manifest['warmup_time']
+        self.instability = manifest.get('instability')
+        self.orders = self.map_table('orders', manifest['orders'])
+        self.events = self.map_table('events', manifest['events']) if 'events' in manifest else None
+
+    def map_table(self, table, table_manifest):
+        columns = {}
+        for name, dtype in table_manifest['columns'].items():
+            path = os.path.join(self.directory, f'{table}.{name}')
+            if table_manifest['n_rows'] == 0:
+                columns[name] = np.empty(0, dtype=dtype)
+            else:
+                columns[name] = np.memmap(path, dtype=dtype, mode='r', shape=(table_manifest['n_rows'],))
+        return columns
+
+    def wip_trajectory(self):
+        """Times and number of orders in the warehouse after every arrival and departure"""
+        enter = np.asarray(self.orders['enter_time'])
+        exit_time = np.asarray(self.orders['exit_time'])
+        exit_time = exit_time[~np.isnan(exit_time)]
+        times = np.concatenate([[0.0], enter, exit_time])
+        steps = np.concatenate([[0], np.ones(len(enter), dtype=np.int64), -np.ones(len(exit_time), dtype=np.int64)])
+        order = np.argsort(times, kind='stable')
+        return times[order], np.cumsum(steps[order])
+
+    def sojourn_times(self, after_warmup=True):
+        """Sojourn times of the served orders (by default only the ones finished after the warm-up)"""
+        exit_time = np.asarray(self.orders['exit_time'])
+        served = ~np.isnan(exit_time)
+        if after_warmup and self.warmup_time is not None:
+            served &= exit_time >= self.warmup_time
+        return exit_time[served] - np.asarray(self.orders['enter_time'])[served]
+
+
+def load_run(directory):
+    return RunRecords(directory)
+
+
+def load_runs(directory):
+    """All the runs stored under directory (one sub directory per run), in name order"""
+    return [RunRecords(os.path.join(directory, name)) for name in sorted(os.listdir(directory))
+            if os.path.exists(os.path.join(directory, name, MANIFEST))]
@@ -0,0 +1,120 @@
+"""Batch entry point - runs a scenario without any plotting and writes its summary results as JSON.
+
+    python run_scenario.py --robots 2 4 10 --rate 0.025 --time-limit 1209600 --repeat 5 --output results.json
+    python run_scenario.py --config scenario.json
+    python run_scenario.py --robots 2 4 --rate 0.013 --seed 1 --cache .sim_cache
+    python run_scenario.py --robots 6 7 8 --rate 0.03 --repeat 10 --crn --antithetic
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from experiment_runner import param_grid, run_grid
+from result_cache import ResultCache
+from variance_reduction import sweep_estimates
+
+DEFAULT_SCENARIO = {
+    'time_limit': 2 * 604800,
+    'robot_num': [2],
+    'order_enter_rate': [0.013],
+    'warmup_dur': 0.1,
+    'repeat': 1,
+    'seed': None,
+    'max_workers': None,
+    'common_random_numbers': False,
+    'antithetic': False,
+    'detect_instability': False,
+}
+
+
+def to_json(obj):
+    if isinstance(obj, np.random.SeedSequence):
+        return {'entropy': obj.entropy, 'spawn_key': list(obj.spawn_key)}
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def as_list(value):
+    return value if isinstance(value, (list, tuple)) else [value]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run a warehouse simulation scenario and write its summary results')
+    parser.add_argument('--config', help='JSON file with the scenario parameters')
+    parser.add_argument('--time-limit', type=float, help='simulated time of every run [sec]')
+    parser.add_argument('--robots', type=int, nargs='+', help='numbers of robots to run')
+    parser.add_argument('--rate', type=float, nargs='+', help='order entering rates to run [orders per sec]')
+    parser.add_argument('--warmup', type=float, help='warm-up fraction of the time limit')
+    parser.add_argument('--repeat', type=int, help='replications of every (robots, rate) cell')
+    parser.add_argument('--seed', type=int, help='root seed of the scenario')
+    parser.add_argument('--workers', type=int, help='worker processes (1 runs in process)')
+    parser.add_argument('--crn', action='store_true', default=None,
+                        help='common random numbers - replication r of every cell on the same seed')
+    parser.add_argument('--antithetic', action='store_true', default=None,
+                        help='run the replications in antithetic pairs (even --repeat)')
+    parser.add_argument('--detect-instability', action='store_true', default=None,
+                        help='end exploding runs early and skip the runs they dominate')
+    parser.add_argument('--output', help='output JSON file (stdout if not given)')
+    parser.add_argument('--cache', help='directory of the run results cache (no cache if not given, needs --seed)')
+    parser.add_argument('--cache-max-mb', type=float, default=1024, help='size bound of the cache [MB]')
+    parser.add_argument('--clear-cache', action='store_true', help='empty the cache before running')
+    parser.add_argument('--quiet', action='store_true', help='do not report progress')
+    return parser.parse_args(argv)
+
+
+def build_scenario(args):
+    scenario = dict(DEFAULT_SCENARIO)
+    if args.config is not None:
+        with open(args.config) as f:
+            scenario.update(json.load(f))
+    overrides = {'time_limit': args.time_limit, 'robot_num': args.robots, 'order_enter_rate': args.rate,
+                 'warmup_dur': args.warmup, 'repeat': args.repeat, 'seed': args.seed, 'max_workers': args.workers,
+                 'common_random_numbers': args.crn, 'antithetic': args.antithetic,
+                 'detect_instability': args.detect_instability}
+    scenario.update({key: value for key, value in overrides.items() if value is not None})
+    return scenario
+
+
+def main(argv=None):
+    start_time = time.perf_counter()
+    args = parse_args(argv)
+    scenario = build_scenario(args)
+    cells = param_grid(time_limit=[scenario['time_limit']], robot_num=as_list(scenario['robot_num']),
+                       order_enter_rate=as_list(scenario['order_enter_rate']),
+                       warmup_dur=[scenario['warmup_dur']])
+    cache = None
+    if args.cache is not None:
+        if scenario['seed'] is None:
+            sys.exit('--cache needs a seed (--seed or the config), a fresh seed never hits the cache')
+        cache = ResultCache(args.cache, max_bytes=int(args.cache_max_mb * 2 ** 20))
+        if args.clear_cache:
+            cache.clear()
+    results = run_grid(cells, repeat=scenario['repeat'], seed=scenario['seed'], max_workers=scenario['max_workers'],
+                       progress=None if args.quiet else report_to_stderr, cache=cache,
+                       common_random_numbers=scenario['common_random_numbers'], antithetic=scenario['antithetic'],
+                       instability=True if scenario['detect_instability'] else None)
+    output = {'scenario': scenario, 'results': results, 'estimates': sweep_estimates(results),
+              'wall_time_sec': time.perf_counter() - start_time}
+
+    if args.output is None:
+        json.dump(output, sys.stdout, default=to_json, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, default=to_json, indent=2)
+    return output
+
+
+def report_to_stderr(n_done, n_total, result):
+    print(f'[{n_done}/{n_total}] robot num = {result["robot_num"]} | enter rate = {result["order_enter_rate"]} | '
+          f'replication = {result["replication"]} | Done', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,121 +1,322 @@
-import numpy as np
-
+from event_calendar import EventCalendar, ORDER, ROBOT_LIFTS_POD, ROBOT_BRINGS_POD_TO_WS, FINISHED_PICKING, \
+    ROBOT_PUTS_POD_DOWN
+from instability import InstabilityDetector
+from instrumentation import Instrumentation
+from order_backlog import OrderBacklog
+from output_analysis import OutputAnalyzer
+from output_stats import StatisticsCollector
+from random_streams import RandomStreams
+from run_export import RunExporter
 from system_objects import Warehouse, Order
-
-
-class Event:
-    def __init__(self, event_type, event_start, event_obj):
-        self.event_type = event_type
-        self.event_start = event_start
-        self.event_obj = event_obj
-
-    def __repr__(self):
-        return str(self.event_type) + ' ' + str(self.event_start) + ' ' + str(self.event_obj)
+from trajectory import TrajectoryRecorder
 
 
 class Simulation:
-    def __init__(self, time_limit, robot_num, order_enter_rate, warmup_dur=0.1):
+    def __init__(self, time_limit, robot_num, order_enter_rate, warmup_dur=0.1, seed=None, keep_orders=False,
+                 trajectory_mode='full', trajectory_step=None, trajectory_path=None, warehouse_params=None,
+                 presample_picking=False, antithetic=False):
         self.curr_time = 0
+        self.n_events = 0
         self.time_limit = time_limit
         self.warmup_dur = warmup_dur
         self.order_enter_rate = order_enter_rate
-
-        self.warehouse = Warehouse(r_amount=robot_num)
-        self.events_lst = []
-        self.empty_spots = []
+        # the picking work of an order is drawn when it arrives, so with common random numbers
+        # the n-th order gets the same picking time whatever the configuration (see variance_reduction.py)
+        self.presample_picking = presample_picking
+
+        self.streams = RandomStreams(seed, antithetic=antithetic)
+        self.seed = self.streams.seed
+        # extra Warehouse arguments (layout, number of item types...)
+        self.warehouse_params = dict(warehouse_params or {})
+        self.warehouse = Warehouse(r_amount=robot_num, streams=self.streams, **self.warehouse_params)
+        self.event_calendar = EventCalendar()
+        self.set_event_handlers()
         self.setup_instance()
 
-        self.orders_in_sys_queue = []
-        self.times_lst = [self.curr_time]
-        self.order_cnt_lst = [0]
+        self.orders_in_sys_queue = OrderBacklog()
+        # number of orders in the warehouse over time
+        self.wip_trajectory = TrajectoryRecorder(trajectory_mode, trajectory_step, path=trajectory_path)
+        self.wip_trajectory.start(self.curr_time, 0)
+        # served Order objects are kept only if keep_orders, the statistics are always collected
+        self.keep_orders = keep_orders
         self.served_orders = []
         self.served_orders_while_warmup = 0
+        self.stats = StatisticsCollector()
+        self.instrumentation = None
+        # streaming warm-up detection and confidence intervals, see run_until_precision
+        self.output_analyzer = None
+        # columnar per-order / event output, see export_to
+        self.exporter = None
+        # early end of exploding runs, see detect_instability
+        self.instability_detector = None
+
+    def set_event_handlers(self):
+        self.event_handlers = {
+            ORDER: self.perform_event_order,
+            ROBOT_LIFTS_POD: self.perform_event_lift,
+            ROBOT_BRINGS_POD_TO_WS: self.perform_event_arrive_ws,
+            FINISHED_PICKING: self.perform_picking_finish,
+            ROBOT_PUTS_POD_DOWN: self.perform_event_store,
+        }
+        return
+
+    def __getstate__(self):
+        # the handlers and the instrumentation are bound to this instance, see checkpoint.py
+        state = dict(self.__dict__)
+        for name in ('event_handlers', 'perform_curr_event', 'instrumentation', 'exporter'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.instrumentation = None
+        self.exporter = None
+        self.set_event_handlers()
+
+    @property
+    def times_lst(self):
+        return self.wip_trajectory.as_arrays()[0]
+
+    @property
+    def order_cnt_lst(self):
+        return self.wip_trajectory.as_arrays()[1]
+
+    def instrument(self, instrumentation=None, **kwargs):
+        """
+        Attaches (and returns) an Instrumentation - profiling counters, histograms and observers.
+        The observers of a replaced instrumentation (e.g. the export event trace) are kept.
+        """
+        observers = []
+        if self.instrumentation is not None:
+            observers = self.instrumentation.observers
+            self.instrumentation.detach()
+        if instrumentation is None:
+            instrumentation = Instrumentation(**kwargs)
+        for callback in observers:
+            if callback not in instrumentation.observers:
+                instrumentation.add_observer(callback)
+        instrumentation.attach(self)
+        self.instrumentation = instrumentation
+        return instrumentation
+
+    def export_to(self, directory, event_trace=False, chunk_size=65536):
+        """Streams the orders (and with event_trace every event) of the run to directory, see run_export.py"""
+        meta = {'time_limit': self.time_limit, 'robot_num': len(self.warehouse.robot_list),
+                'order_enter_rate': self.order_enter_rate, 'warmup_dur': self.warmup_dur,
+                'warehouse_params': self.warehouse_params, 'seed': self.seed,
+                'presample_picking': self.presample_picking, 'antithetic': self.streams.antithetic}
+        self.exporter = RunExporter(directory, event_trace=event_trace, chunk_size=chunk_size, meta=meta)
+        if event_trace:
+            self.exporter.simulation = self
+            if self.instrumentation is not None:
+                # joins the attached instrumentation, its counters keep counting
+                self.instrumentation.add_observer(self.exporter.record_event)
+            else:
+                self.instrument(profile=False, track_lengths=False, observers=[self.exporter.record_event])
+        return self.exporter
+
+    def detect_instability(self, check_interval=None, drift_tol=0.02, z=3.0, confirmations=3, start_time=None):
+        """Ends the run once its backlog is confirmed to grow without bound, see instability.py"""
+        if check_interval is None:
+            check_interval = self.time_limit / 100
+        self.instability_detector = InstabilityDetector(check_interval, drift_tol, z, confirmations, start_time)
+        return self.instability_detector
 
     def setup_instance(self):
         self.warehouse.build_warehouse()
-        first_event_start_time = np.random.exponential(1.0 / self.order_enter_rate)
-        first_order = Order(first_event_start_time, np.random.randint(self.warehouse.number_of_types), status='queue')
-        self.events_lst.append(Event('order', first_event_start_time, first_order))
+        first_event_start_time = self.streams.interarrival.exponential(1.0 / self.order_enter_rate)
+        first_order = self.new_order(first_event_start_time)
+        self.event_calendar.schedule(ORDER, first_event_start_time, first_order)
         return
 
+    def new_order(self, enter_time):
+        order_obj = Order(enter_time, self.streams.item_type.integers(self.warehouse.number_of_types), status='queue')
+        if self.presample_picking:
+            order_obj.o_work = self.streams.picking_time.exponential()
+        return order_obj
+
     def run_simulation(self):
-        is_end_warm_up = False
-        while self.curr_time < self.time_limit:
+        self.run_until(self.time_limit)
+
+    def run_until(self, until_time):
+        """
+        Performs events until the simulation time reaches until_time (capped by time_limit); the last
+        event performed is the first one at or after until_time. Successive calls continue the same run.
+        With detect_instability the run also ends once it is confirmed unstable.
+        """
+        stop_time = min(until_time, self.time_limit)
+        detector = self.instability_detector
+        if detector is None:
+            self.run_events(stop_time)
+        else:
+            while self.curr_time < stop_time and not detector.unstable:
+                self.run_events(min(stop_time, detector.next_check))
+                if self.curr_time >= detector.next_check and detector.check(self):
+                    self.finish_run()
+        if self.curr_time >= self.time_limit:
+            self.finish_run()
+        return self.curr_time
+
+    def run_events(self, stop_time):
+        warmup_end = self.warmup_dur * self.time_limit
+        # the warm-up state is kept in stats, so a restored checkpoint resumes where it stopped
+        while self.curr_time < stop_time:
             self.perform_curr_event()
-            if self.curr_time >= self.warmup_dur * self.time_limit and not is_end_warm_up:
-                is_end_warm_up = True
-                self.served_orders_while_warmup = len(self.served_orders)
-
-    def perform_curr_event(self):
-        self.events_lst.sort(key=lambda event: event.event_start)
-        curr_event = self.events_lst.pop(0)
-        self.curr_time = curr_event.event_start
-
-        if curr_event.event_type == 'order':
-            self.perform_event_order(curr_event)
+            if self.curr_time >= warmup_end and not self.stats.is_warm():
+                self.served_orders_while_warmup = self.stats.n_served
+                self.stats.end_warmup(self.curr_time)
+        return
 
-        elif curr_event.event_type == 'robot_lifts_pod':
-            self.perform_event_lift(curr_event)
+    def step(self, n_events=1):
+        """Performs up to n_events events (fewer if the run finishes), returns the number performed"""
+        warmup_end = self.warmup_dur * self.time_limit
+        detector = self.instability_detector
+        n_done = 0
+        while n_done < n_events and not self.is_finished():
+            self.perform_curr_event()
+            n_done += 1
+            if self.curr_time >= warmup_end and not self.stats.is_warm():
+                self.served_orders_while_warmup = self.stats.n_served
+                self.stats.end_warmup(self.curr_time)
+            if detector is not None and self.curr_time >= detector.next_check and detector.check(self):
+                self.finish_run()
+        if self.curr_time >= self.time_limit:
+            self.finish_run()
+        return n_done
+
+    def is_finished(self):
+        if self.instability_detector is not None and self.instability_detector.unstable:
+            return True
+        return self.curr_time >= self.time_limit
+
+    def finish_run(self):
+        if self.exporter is not None:
+            self.exporter.finish(self)
+        return
 
-        elif curr_event.event_type == 'robot_brings_pod_to_ws':
-            self.perform_event_arrive_ws(curr_event)
+    def snapshot(self):
+        """Lightweight state of the run - time, WIP, backlog, robot utilisation and running statistics"""
+        robot_num = len(self.warehouse.robot_list)
+        stats = self.stats
+        return {
+            'time': self.curr_time,
+            'n_events': self.n_events,
+            'wip': stats.wip,
+            'backlog': len(self.orders_in_sys_queue),
+            'busy_robots': robot_num - len(self.warehouse.idle_robots),
+            'robot_utilization': (robot_num - len(self.warehouse.idle_robots)) / robot_num if robot_num else 0.0,
+            'n_arrived': stats.n_arrived,
+            'n_served': stats.n_served,
+            'is_warm': stats.is_warm(),
+            'unstable': self.instability_detector is not None and self.instability_detector.unstable,
+            'mean_sojourn': stats.sojourn.mean if stats.sojourn.n else float('nan'),
+            'mean_wip': stats.wip_avg.mean(self.curr_time) if stats.wip_avg is not None else float('nan'),
+        }
+
+    def snapshots(self, interval, until_time=None):
+        """Generator - runs the simulation and yields a snapshot every interval of simulation time"""
+        stop_time = self.time_limit if until_time is None else min(until_time, self.time_limit)
+        next_time = self.curr_time + interval
+        while self.curr_time < stop_time and not self.is_finished():
+            self.run_until(min(next_time, stop_time))
+            next_time += interval
+            yield self.snapshot()
+
+    def run_until_precision(self, target_rel_half_width=0.05, metric='sojourn', check_interval=None,
+                            throughput_interval=3600.0, n_batches=20, confidence=0.95):
+        """
+        Sequential stopping - runs until the batch means confidence interval of metric ('sojourn' or
+        'throughput'), after the MSER-5 warm-up truncation, is within target_rel_half_width of its mean.
+        time_limit is the hard cap. The returned analysis holds the truncation point and the achieved precision.
+        """
+        if metric not in ('sojourn', 'throughput'):
+            raise ValueError(f'metric must be sojourn or throughput, got {metric!r}')
+        if self.output_analyzer is None:
+            self.output_analyzer = OutputAnalyzer(throughput_interval, n_batches, confidence)
+        if check_interval is None:
+            check_interval = self.time_limit / 100
+        stopped_by = 'time_limit'
+        while not self.is_finished():
+            self.run_until(self.curr_time + check_interval)
+            analysis = self.output_analyzer.analyze(self.curr_time)
+            if analysis[metric]['rel_half_width'] <= target_rel_half_width:
+                stopped_by = 'precision'
+                self.finish_run()
+                break
+        analysis = self.output_analyzer.analyze(self.curr_time)
+        analysis.update(metric=metric, target_rel_half_width=target_rel_half_width, stopped_by=stopped_by,
+                        end_time=self.curr_time)
+        return analysis
+
+    def set_order_enter_rate(self, order_enter_rate):
+        """Changes the enter rate of a running simulation - the pending arrival is drawn again (memoryless)"""
+        self.order_enter_rate = order_enter_rate
+        for _, _, event in self.event_calendar.heap:
+            if event.event_type == ORDER and not event.cancelled:
+                self.event_calendar.cancel(event)
+                next_order = event.event_obj
+                next_order_start = self.curr_time + self.streams.interarrival.exponential(1.0 / order_enter_rate)
+                next_order.o_enter_time = next_order_start
+                self.event_calendar.schedule(ORDER, next_order_start, next_order)
+                break
+        return
 
-        elif curr_event.event_type == 'finished_picking':
-            self.perform_picking_finish(curr_event)
+    def add_robots(self, amount):
+        """Adds idle robots to a running simulation, they take waiting orders right away"""
+        new_robots = self.warehouse.add_robots(amount)
+        for robot in new_robots:
+            self.assign_backlog_order(robot)
+        return new_robots
 
-        elif curr_event.event_type == 'robot_puts_pod_down':
-            self.perform_event_store(curr_event)
+    def perform_curr_event(self):
+        curr_event = self.event_calendar.next_event()
+        self.curr_time = curr_event.event_start
+        self.n_events += 1
+        self.event_handlers[curr_event.event_type](curr_event)
         return
 
     def perform_event_order(self, curr_event):
-        self.times_lst.append(self.curr_time)
-        self.order_cnt_lst.append(self.order_cnt_lst[-1] + 1)
+        self.stats.order_arrived(self.curr_time)
+        self.wip_trajectory.record(self.curr_time, self.stats.wip)
 
         # Handle current Order
         curr_order = curr_event.event_obj
-        avail_robots = self.warehouse.find_available_robots()
         item_in_order = curr_order.o_item
-        avail_pods = self.warehouse.find_available_pods(item_type=item_in_order)
-        if len(avail_robots) >= 1 and len(avail_pods) >= 1:
-            curr_robot = avail_robots[0]
+        n_avail_pods = self.warehouse.count_available_pods(item_in_order)
+        if len(self.warehouse.idle_robots) >= 1 and n_avail_pods >= 1:
             # Sample pod number out of available pods
-            pod_index = np.random.randint(len(avail_pods))
+            pod_index = self.streams.pod_choice.integers(n_avail_pods)
             # the selected pod object
-            curr_pod = avail_pods[pod_index]
+            curr_pod = self.warehouse.sample_available_pod(item_in_order, pod_index)
+            # the pod is the target of the robot selection policy (see EntityPool.select)
+            curr_robot = self.warehouse.get_free_robot(curr_pod.get_location())
             arrival_to_pod_dur = curr_robot.assign_order_to_robot(curr_order, curr_pod)
             curr_pod.assign_order_to_robot()
             curr_order.assign_order_to_robot()
-            arrival_to_pod_event = Event('robot_lifts_pod', self.curr_time + arrival_to_pod_dur, curr_robot)
-            self.events_lst.append(arrival_to_pod_event)
+            self.event_calendar.schedule(ROBOT_LIFTS_POD, self.curr_time + arrival_to_pod_dur, curr_robot)
 
         else:
             self.orders_in_sys_queue.append(curr_order)
 
         # Create a new Order arrival
-        next_order_start = np.random.exponential(1.0 / self.order_enter_rate)
-        next_order = Order(self.curr_time + next_order_start, np.random.randint(self.warehouse.number_of_types), status='queue')
-        self.events_lst.append(Event('order', self.curr_time + next_order_start, next_order))
+        next_order_start = self.streams.interarrival.exponential(1.0 / self.order_enter_rate)
+        next_order = self.new_order(self.curr_time + next_order_start)
+        self.event_calendar.schedule(ORDER, self.curr_time + next_order_start, next_order)
 
     def perform_event_lift(self, curr_event):
         curr_robot = curr_event.event_obj
-        empty_spot = self.warehouse.release_pod_spot(curr_robot.r_pos)
-        self.empty_spots.append(empty_spot)
-        avail_workstations = self.warehouse.find_available_workstations()
-
-        if len(avail_workstations) >= 1:
-            curr_ws = avail_workstations[0]
-            curr_ws.ws_occupied = True
-        else:
+        self.warehouse.release_pod_spot(curr_robot.r_pos)
+        curr_ws = self.warehouse.get_free_workstation(curr_robot.r_pos)
+        if curr_ws is None:
             # no available ws, sample one
-            curr_ws = np.random.choice(self.warehouse.ws_list)
+            curr_ws = self.streams.ws_fallback.choice(self.warehouse.ws_list)
 
         arrival_to_ws_dur = curr_robot.assign_robot_to_workstation(curr_ws)
         curr_pod = self.warehouse.find_pod_by_ind(curr_robot.r_occupied)
         curr_pod.assign_robot_to_workstation(curr_robot)
         curr_ws.assign_robot_to_workstation()
 
-        arrival_to_ws_event = Event('robot_brings_pod_to_ws', self.curr_time + arrival_to_ws_dur, curr_robot)
-        self.events_lst.append(arrival_to_ws_event)
+        self.event_calendar.schedule(ROBOT_BRINGS_POD_TO_WS, self.curr_time + arrival_to_ws_dur, curr_robot)
         return
 
     def perform_event_arrive_ws(self, curr_event):
@@ -123,8 +324,7 @@ class Simulation:
         curr_ws = self.warehouse.find_ws_by_ind(curr_robot.r_ws)
         finish_picking_dur = curr_ws.assign_order_to_picking(curr_robot)
         if finish_picking_dur >= 0:
-            finish_picking_event = Event('finished_picking', self.curr_time + finish_picking_dur, curr_robot)
-            self.events_lst.append(finish_picking_event)
+            self.event_calendar.schedule(FINISHED_PICKING, self.curr_time + finish_picking_dur, curr_robot)
         return
 
     def perform_picking_finish(self, curr_event):
@@ -135,25 +335,28 @@ class Simulation:
 
         # Finish service of Order
         curr_order.finish_service_order(self.curr_time)
-        self.times_lst.append(self.curr_time)
-        self.order_cnt_lst.append(self.order_cnt_lst[-1] - 1)
-        self.served_orders.append(curr_order)
+        self.stats.order_finished(curr_order, self.curr_time)
+        self.wip_trajectory.record(self.curr_time, self.stats.wip)
+        if self.exporter is not None:
+            self.exporter.order_finished(curr_order, curr_robot, self.curr_time)
+        if self.output_analyzer is not None:
+            self.output_analyzer.order_finished(curr_order.o_exit_time - curr_order.o_enter_time, self.curr_time)
+        if self.keep_orders:
+            self.served_orders.append(curr_order)
 
         # Start a new order
         res = curr_ws.serve_order_from_line()
         if res is not None:
             finish_picking_dur, next_robot = res
-            finish_picking_event = Event('finished_picking', self.curr_time + finish_picking_dur, next_robot)
-            self.events_lst.append(finish_picking_event)
+            self.event_calendar.schedule(FINISHED_PICKING, self.curr_time + finish_picking_dur, next_robot)
 
         # Store the pod back
-        empty_spot_ind = np.random.randint(len(self.empty_spots))
-        store_spot_arr = self.empty_spots.pop(empty_spot_ind)
+        empty_spot_ind = self.streams.spot_choice.integers(self.warehouse.grid.num_empty_spots())
+        store_spot_arr = self.warehouse.sample_empty_spot(empty_spot_ind)
         empty_spot_loc = self.warehouse.keep_empty_spot(store_spot_arr[0], store_spot_arr[1])
         arrival_spot_dur = curr_robot.send_pod_to_store(empty_spot_loc)
         curr_pod.send_pod_to_store(empty_spot_loc)
-        pod_store_event = Event('robot_puts_pod_down', self.curr_time + arrival_spot_dur, curr_robot)
-        self.events_lst.append(pod_store_event)
+        self.event_calendar.schedule(ROBOT_PUTS_POD_DOWN, self.curr_time + arrival_spot_dur, curr_robot)
         return
 
     def perform_event_store(self, curr_event):
@@ -162,26 +365,27 @@ class Simulation:
         curr_robot.store_pod()
         curr_pod.store_pod()
 
-        # Find new order to robot
+        self.assign_backlog_order(curr_robot)
+        return
+
+    def assign_backlog_order(self, curr_robot):
+        # Find new order to robot - the oldest order in the queue that has an available pod
         if len(self.orders_in_sys_queue) >= 1:
-            for order_ind, order_obj in enumerate(self.orders_in_sys_queue):
+            order_obj = self.orders_in_sys_queue.pop_oldest(
+                lambda item_type: self.warehouse.count_available_pods(item_type) >= 1)
+            if order_obj is not None:
                 item_in_order = order_obj.o_item
-                avail_pods = self.warehouse.find_available_pods(item_in_order)
-                if len(avail_pods) >= 1:
-                    self.orders_in_sys_queue.pop(order_ind)
-                    # Sample pod number out of available pods
-                    pod_index = np.random.randint(len(avail_pods))
-                    # the selected pod object
-                    curr_pod = avail_pods[pod_index]
-                    arrival_to_pod_dur = curr_robot.assign_order_to_robot(order_obj, curr_pod)
-                    curr_pod.assign_order_to_robot()
-                    order_obj.assign_order_to_robot()
-                    arrival_to_pod_event = Event('robot_lifts_pod', self.curr_time + arrival_to_pod_dur, curr_robot)
-                    self.events_lst.append(arrival_to_pod_event)
-                    break
+                n_avail_pods = self.warehouse.count_available_pods(item_in_order)
+                # Sample pod number out of available pods
+                pod_index = self.streams.pod_choice.integers(n_avail_pods)
+                # the selected pod object
+                curr_pod = self.warehouse.sample_available_pod(item_in_order, pod_index)
+                arrival_to_pod_dur = curr_robot.assign_order_to_robot(order_obj, curr_pod)
+                curr_pod.assign_order_to_robot()
+                order_obj.assign_order_to_robot()
+                self.event_calendar.schedule(ROBOT_LIFTS_POD, self.curr_time + arrival_to_pod_dur, curr_robot)
         return
 
-
 if __name__ == '__main__':
     simu_instance = Simulation(time_limit=604800*2, warmup_dur=0.1, robot_num=2, order_enter_rate=0.014 - 0.001)
     simu_instance.run_simulation()
@@ -1,11 +1,35 @@
+from collections import OrderedDict
+
 import numpy as np
-from scipy.spatial import distance
-import matplotlib.pyplot as plt
-import pandas as pd
 
+from layout import WarehouseLayout, assign_items_to_pods, default_layout
+from random_streams import RandomStreams
 from utilis import calc_distance, calc_time_dur
 
 
+class RobotArrays:
+    """
+    #### State of a robots fleet, indexed by robot id
+    - pos - (robots, 2) x,y locations
+    - occupied - pod id the robot takes care of, -1 if free
+    - ws - workstation id the robot is set to, -1 if none
+    """
+    def __init__(self, capacity=1):
+        self.pos = np.zeros((capacity, 2))
+        self.occupied = np.full(capacity, -1, dtype=np.int64)
+        self.ws = np.full(capacity, -1, dtype=np.int64)
+
+    def ensure(self, r_id):
+        capacity = len(self.occupied)
+        if r_id < capacity:
+            return
+        new_capacity = max(2 * capacity, r_id + 1)
+        self.pos = np.concatenate([self.pos, np.zeros((new_capacity - capacity, 2))])
+        self.occupied = np.concatenate([self.occupied, np.full(new_capacity - capacity, -1, dtype=np.int64)])
+        self.ws = np.concatenate([self.ws, np.full(new_capacity - capacity, -1, dtype=np.int64)])
+        return
+
+
 class Robot:
     """
     #### Robot's class
@@ -16,58 +40,108 @@ class Robot:
     - pod id (-1 if not carring a pod, else -pod's id)
     - work station id (-1 if not set for a ws, else - ws index)
     - r_order - the order which the robot is taking care of
+    - r_pool - the idle robots pool the robot joins and leaves
+    - r_travel - the warehouse travel table (plain distance calculation if None)
+    Location, pod id and work station id live in the fleet's RobotArrays (a private one
+    if no store is given).
     """
-    def __init__(self, x, y, r_id, speed=1.3, l_time=1, s_time=1, pod_id=None, work_station=-1, r_order=None):
+    __slots__ = ('r_speed', 'r_PodLiftTime', 'r_PodStoreTime', 'r_id', 'r_order', 'r_pool', 'r_travel',
+                 'r_store', 'r_ind')
+
+    def __init__(self, x, y, r_id, speed=1.3, l_time=1, s_time=1, pod_id=None, work_station=-1, r_order=None,
+                 store=None):
+        if store is None:
+            store = RobotArrays()
+            self.r_ind = 0
+        else:
+            store.ensure(r_id)
+            self.r_ind = r_id
+        self.r_store = store
         self.r_speed = speed  # constant speed 1.3 m/s
         self.r_occupied = pod_id  # if None it's not occupied. else it's pod id
         self.r_ws = work_station  # if -1 not working for any workstation
         self.r_PodLiftTime = l_time
         self.r_PodStoreTime = s_time
         self.r_id = r_id
-        self.r_pos = [x, y]
+        self.update_location(x, y)
         self.r_order = r_order
+        self.r_pool = None
+        self.r_travel = None
 
     def __repr__(self):
         return str(self.r_id) + ' ' + ' is occupied?' + str(self.r_occupied)
 
+    @property
+    def r_occupied(self):
+        pod_id = self.r_store.occupied[self.r_ind]
+        return None if pod_id == -1 else int(pod_id)
+
+    @r_occupied.setter
+    def r_occupied(self, pod_id):
+        self.r_store.occupied[self.r_ind] = -1 if pod_id is None else pod_id
+
+    @property
+    def r_ws(self):
+        return int(self.r_store.ws[self.r_ind])
+
+    @r_ws.setter
+    def r_ws(self, ws_ind):
+        self.r_store.ws[self.r_ind] = ws_ind
+
+    @property
+    def r_pos(self):
+        # a copy of the location, update_location changes it
+        return self.r_store.pos[self.r_ind].tolist()
+
     def is_free(self):
-        return self.r_occupied is None
+        return self.r_store.occupied[self.r_ind] == -1
 
     def get_location(self):
         return self.r_pos
 
     def update_location(self, new_x, new_y):
-        self.r_pos = [new_x, new_y]
+        pos = self.r_store.pos
+        pos[self.r_ind, 0] = new_x
+        pos[self.r_ind, 1] = new_y
         return
 
     def assign_order_to_robot(self, order_obj, pod_obj):
         self.r_order = order_obj
         self.r_occupied = pod_obj.pod_id
-        dist = calc_distance(self.r_pos, [pod_obj.pod_x, pod_obj.pod_y])
+        if self.r_pool is not None:
+            self.r_pool.remove(self)
+        pod_x, pod_y = pod_obj.get_location()
+        dist = calc_distance(self.r_pos, (pod_x, pod_y))
         arrival_time_to_pod = calc_time_dur(dist, self.r_speed) + self.r_PodLiftTime
-        self.update_location(pod_obj.pod_x, pod_obj.pod_y)
+        self.update_location(pod_x, pod_y)
         return arrival_time_to_pod
 
     def assign_robot_to_workstation(self, workstation_obj):
         self.r_ws = workstation_obj.get_ind()
-        if int(self.r_pos[1]) % 2 == 0:
-            add_move = 1
-        else:
-            add_move = 0
         ws_loc = workstation_obj.get_location()
-        dist = calc_distance(self.r_pos, ws_loc) + add_move
+        r_pos = self.r_pos
+        if self.r_travel is not None:
+            dist = self.r_travel.to_workstation(r_pos, workstation_obj.get_ind())
+        else:
+            dist = calc_distance(r_pos, ws_loc) + default_layout().add_move(r_pos[1])
         arrival_time_ws = calc_time_dur(dist, self.r_speed)
-        self.r_pos[0], self.r_pos[1] = ws_loc[0], ws_loc[1]
+        self.update_location(ws_loc[0], ws_loc[1])
         return arrival_time_ws
 
     def send_pod_to_store(self, empty_spot_loc):
-        dist = calc_distance(self.r_pos, empty_spot_loc)
+        ws_ind = self.r_ws
+        if self.r_travel is not None and ws_ind != -1:
+            dist = self.r_travel.from_workstation(ws_ind, empty_spot_loc)
+        else:
+            dist = calc_distance(self.r_pos, empty_spot_loc)
         arrival_time_spot = calc_time_dur(dist, self.r_speed) + self.r_PodStoreTime
         self.update_location(empty_spot_loc[0], empty_spot_loc[1])
         return arrival_time_spot
 
     def store_pod(self):
         self.r_occupied = None
+        if self.r_pool is not None:
+            self.r_pool.add(self)
         return
 
 
@@ -79,12 +153,17 @@ class Order:
     - exit time
     - item in order
     - status
+    - work - picking work (a standard exponential) drawn when the order arrives, or None to
+      draw the picking time when picking starts
     """
-    def __init__(self, enter_time, item, status="queue", exit_time=None):
+    __slots__ = ('o_enter_time', 'o_exit_time', 'o_item', 'o_status', 'o_work')
+
+    def __init__(self, enter_time, item, status="queue", exit_time=None, work=None):
         self.o_enter_time = enter_time
         self.o_exit_time = exit_time
         self.o_item = item
         self.o_status = status  # can get queue, wip or done
+        self.o_work = work
 
     def __repr__(self):
         return str(self.o_item) + ' ' + str(self.o_enter_time) + " " + str(self.o_exit_time)
@@ -107,13 +186,17 @@ class WorkStation:
     - ws_id 0,1,2
     - picking_rate (1.0/15 as default)
     - orders - robot's list set to the ws with their order
+    - ws_pool - the free workstations pool the ws joins and leaves
+    - rng - random stream of the picking times (numpy's global generator if None)
     """
-    def __init__(self, x, y, ws_id, picking_rate=1.0 / 15, orders=[]):
+    def __init__(self, x, y, ws_id, picking_rate=1.0 / 15, orders=[], rng=None):
         self.ws_location = (x, y)
         self.ws_id = ws_id
         self.ws_picking_rate = picking_rate
         self.ws_occupied = False
         self.ws_orders = orders
+        self.ws_pool = None
+        self.ws_rng = rng if rng is not None else np.random
 
     def __repr__(self):
         return str(self.ws_id) + ' ' + str(self.ws_location)
@@ -132,12 +215,20 @@ class WorkStation:
 
     def assign_robot_to_workstation(self):
         self.ws_occupied = True
+        if self.ws_pool is not None:
+            self.ws_pool.remove(self)
         return
 
+    def picking_duration(self, robot_obj):
+        work = robot_obj.r_order.o_work
+        if work is None:
+            return self.ws_rng.exponential(1.0 / self.ws_picking_rate)
+        return work * (1.0 / self.ws_picking_rate)
+
     def assign_order_to_picking(self, robot_obj):
         time_till_pick_finish = -1
         if not self.are_orders_in_line():
-            time_till_pick_finish = np.random.exponential(1.0/self.ws_picking_rate)
+            time_till_pick_finish = self.picking_duration(robot_obj)
         else:
             self.ws_orders.append(robot_obj)
         return time_till_pick_finish
@@ -145,10 +236,12 @@ class WorkStation:
     def serve_order_from_line(self):
         if self.are_orders_in_line():
             curr_robot = self.ws_orders.pop(0)
-            time_till_pick_finish = np.random.exponential(1.0 / self.ws_picking_rate)
+            time_till_pick_finish = self.picking_duration(curr_robot)
             return time_till_pick_finish, curr_robot
         else:
             self.ws_occupied = False
+            if self.ws_pool is not None:
+                self.ws_pool.add(self)
             return None
 
 
@@ -167,6 +260,26 @@ class Item:
         return str(self.item_id) + ' ' + str(self.item_pod_lst)
 
 
+class PodArrays:
+    """
+    #### State of the pods, indexed by pod id
+    - xy - (pods, 2) x,y locations
+    - in_use - 1 if the pod is in use by a robot, else 0
+    """
+    def __init__(self, capacity=1):
+        self.xy = np.zeros((capacity, 2))
+        self.in_use = np.zeros(capacity, dtype=np.int8)
+
+    def ensure(self, pod_id):
+        capacity = len(self.in_use)
+        if pod_id < capacity:
+            return
+        new_capacity = max(2 * capacity, pod_id + 1)
+        self.xy = np.concatenate([self.xy, np.zeros((new_capacity - capacity, 2))])
+        self.in_use = np.concatenate([self.in_use, np.zeros(new_capacity - capacity, dtype=np.int8)])
+        return
+
+
 class Pod:
     """
     #### Pod's class
@@ -174,35 +287,295 @@ class Pod:
     - pod x location
     - pod y location
     - pod in use - if the pod is in use by a robot or not
+    - pod items - the item types stored in the pod
+    - pod index - the free pods index the pod reports its state changes to
+    Location and in use flag live in the warehouse's PodArrays (a private one if no
+    store is given).
     """
-    def __init__(self, pod_id, pod_x, pod_y, pod_in_use=0):
+    __slots__ = ('pod_id', 'pod_items', 'pod_index', 'pod_store', 'pod_ind')
+
+    def __init__(self, pod_id, pod_x, pod_y, pod_in_use=0, store=None):
+        if store is None:
+            store = PodArrays()
+            self.pod_ind = 0
+        else:
+            store.ensure(pod_id)
+            self.pod_ind = pod_id
+        self.pod_store = store
         self.pod_id = pod_id
         self.pod_x = pod_x
         self.pod_y = pod_y
         self.pod_in_use = pod_in_use
+        self.pod_items = []
+        self.pod_index = None
 
     def __repr__(self):
         return str(self.pod_id) + ' ' + str(self.pod_x) + ' ' + str(self.pod_y) + str(self.pod_in_use)
 
+    @property
+    def pod_x(self):
+        return self.pod_store.xy[self.pod_ind, 0]
+
+    @pod_x.setter
+    def pod_x(self, x):
+        self.pod_store.xy[self.pod_ind, 0] = x
+
+    @property
+    def pod_y(self):
+        return self.pod_store.xy[self.pod_ind, 1]
+
+    @pod_y.setter
+    def pod_y(self, y):
+        self.pod_store.xy[self.pod_ind, 1] = y
+
+    @property
+    def pod_in_use(self):
+        return int(self.pod_store.in_use[self.pod_ind])
+
+    @pod_in_use.setter
+    def pod_in_use(self, in_use):
+        self.pod_store.in_use[self.pod_ind] = in_use
+
+    def get_location(self):
+        x, y = self.pod_store.xy[self.pod_ind].tolist()
+        return x, y
+
     def is_free(self):
-        return self.pod_in_use == 0
+        return self.pod_store.in_use[self.pod_ind] == 0
 
     def assign_order_to_robot(self):
         self.pod_in_use = 1
+        if self.pod_index is not None:
+            self.pod_index.remove_pod(self)
         return
 
     def assign_robot_to_workstation(self, robot_obj):
-        self.pod_x, self.pod_y = robot_obj.get_location()
+        self.pod_store.xy[self.pod_ind] = robot_obj.get_location()
         return
 
     def send_pod_to_store(self, empty_spot_loc):
-        self.pod_x, self.pod_y = empty_spot_loc
+        self.pod_store.xy[self.pod_ind] = empty_spot_loc
         return
 
     def store_pod(self):
         self.pod_in_use = 0
+        if self.pod_index is not None:
+            self.pod_index.add_pod(self)
+        return
+
+
+class EntityPool:
+    """
+    #### Pool of free entities
+    Ordered set of entities keyed by their id. Entities join and leave in O(1) and
+    select() returns the entity the pool hands out next, without removing it.
+    Other selection policies (least recently used, nearest to a target location...)
+    are made by overriding select().
+    """
+    def __init__(self, key):
+        self.key = key
+        self.members = OrderedDict()
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, entity):
+        return self.key(entity) in self.members
+
+    def __iter__(self):
+        return iter(self.members.values())
+
+    def add(self, entity):
+        self.members[self.key(entity)] = entity
+        return
+
+    def remove(self, entity):
+        self.members.pop(self.key(entity), None)
+        return
+
+    def select(self, target=None):
+        # the entity that waits the longest in the pool
+        for entity in self.members.values():
+            return entity
+        return None
+
+
+def robot_key(robot):
+    return robot.r_id
+
+
+def station_key(station):
+    return station.ws_id
+
+
+# the pool keys are module level functions, so the pools can be pickled (see checkpoint.py)
+class IdleRobotPool(EntityPool):
+    """
+    #### Idle robots, handed out first in first out
+    """
+    def __init__(self):
+        super().__init__(key=robot_key)
+
+
+class FreeWorkstationPool(EntityPool):
+    """
+    #### Free workstations, handed out first in first out
+    """
+    def __init__(self):
+        super().__init__(key=station_key)
+
+
+class FreePodIndex:
+    """
+    #### Free pods per item type
+    - free_pods - for each item type, list of the free pods that contain it
+    - pod_pos - for each item type, hash from pod id to its index in free_pods
+    Pods are removed by swapping with the last pod, so add, remove, count, membership
+    and sampling by index are all O(1).
+    """
+    def __init__(self, number_of_types):
+        self.free_pods = [[] for _ in range(number_of_types)]
+        self.pod_pos = [{} for _ in range(number_of_types)]
+
+    def add_pod(self, pod_obj):
+        for item_type in pod_obj.pod_items:
+            if pod_obj.pod_id not in self.pod_pos[item_type]:
+                self.pod_pos[item_type][pod_obj.pod_id] = len(self.free_pods[item_type])
+                self.free_pods[item_type].append(pod_obj)
+        return
+
+    def remove_pod(self, pod_obj):
+        for item_type in pod_obj.pod_items:
+            ind = self.pod_pos[item_type].pop(pod_obj.pod_id, None)
+            if ind is None:
+                continue
+            item_pods = self.free_pods[item_type]
+            last_pod = item_pods.pop()
+            if ind < len(item_pods):
+                item_pods[ind] = last_pod
+                self.pod_pos[item_type][last_pod.pod_id] = ind
+        return
+
+    def count(self, item_type):
+        return len(self.free_pods[item_type])
+
+    def contains(self, item_type, pod_obj):
+        return pod_obj.pod_id in self.pod_pos[item_type]
+
+    def get_pod(self, item_type, pod_ind):
+        return self.free_pods[item_type][pod_ind]
+
+
+class StorageGrid:
+    """
+    #### Storage grid index
+    - spot_xy - (rows, cols, 2) array of the storage spots coordinates
+    - occupancy - (rows, cols) array, 1 if a pod is stored in the spot, else 0
+    - spot_by_xy - hash from (x, y) to (row, col)
+    - empty_spots - (row, col) of the empty spots, removed by swapping with the last one
+    """
+    def __init__(self, rows):
+        self.set_arrays(np.array([[spot[:2] for spot in row] for row in rows], dtype=float),
+                        np.array([[spot[2] for spot in row] for row in rows], dtype=np.int8))
+
+    @classmethod
+    def from_arrays(cls, spot_xy, occupancy):
+        grid = cls.__new__(cls)
+        grid.set_arrays(np.asarray(spot_xy, dtype=float), np.asarray(occupancy, dtype=np.int8))
+        return grid
+
+    def set_arrays(self, spot_xy, occupancy):
+        self.n_rows, self.n_cols = occupancy.shape
+        self.spot_xy = spot_xy
+        self.occupancy = occupancy
+        spot_ids = np.arange(self.n_rows * self.n_cols)
+        self.spot_by_xy = dict(zip(map(tuple, spot_xy.reshape(-1, 2).tolist()),
+                                   zip((spot_ids // self.n_cols).tolist(), (spot_ids % self.n_cols).tolist())))
+        self.empty_spots = []
+        self.empty_pos = {}
+        for row, col in np.argwhere(self.occupancy == 0).tolist():
+            self.add_empty_spot(row, col)
+
+    def find_by_xy(self, x, y):
+        return self.spot_by_xy[(x, y)]
+
+    def add_empty_spot(self, row, col):
+        if (row, col) not in self.empty_pos:
+            self.empty_pos[(row, col)] = len(self.empty_spots)
+            self.empty_spots.append((row, col))
+        return
+
+    def remove_empty_spot(self, row, col):
+        ind = self.empty_pos.pop((row, col), None)
+        if ind is None:
+            return
+        last_spot = self.empty_spots.pop()
+        if ind < len(self.empty_spots):
+            self.empty_spots[ind] = last_spot
+            self.empty_pos[last_spot] = ind
+        return
+
+    def release(self, row, col):
+        self.occupancy[row, col] = 0
+        self.add_empty_spot(row, col)
         return
 
+    def occupy(self, row, col):
+        self.occupancy[row, col] = 1
+        self.remove_empty_spot(row, col)
+        return
+
+    def num_empty_spots(self):
+        return len(self.empty_spots)
+
+    def num_occupied_spots(self):
+        return int(self.occupancy.sum())
+
+    def occupied_xy(self):
+        return self.spot_xy[self.occupancy == 1]
+
+    def empty_xy(self):
+        return self.spot_xy[self.occupancy == 0]
+
+
+class TravelTable:
+    """
+    #### Precomputed travel distances
+    Storage spots are indexed by their id, row * cols + col.
+    - spot_to_ws - (spots, workstations) distances from a spot to a workstation,
+      including the extra move out of the row (layout.row_add_move)
+    - ws_to_spot - (workstations, spots) distances from a workstation to a spot
+    Points that are not a storage spot fall back to calc_distance (and layout.add_move).
+    """
+    def __init__(self, grid, ws_list, layout):
+        spot_xy = grid.spot_xy.reshape(-1, 2)
+        ws_xy = np.array([station.get_location() for station in ws_list], dtype=float)
+        self.grid = grid
+        self.layout = layout
+        self.ws_xy = ws_xy
+        self.ws_to_spot = (np.abs(ws_xy[:, None, 0] - spot_xy[None, :, 0]) +
+                           np.abs(ws_xy[:, None, 1] - spot_xy[None, :, 1]))
+        add_moves = np.repeat(layout.row_add_move, grid.n_cols)
+        self.spot_to_ws = self.ws_to_spot.T + add_moves[:, None]
+
+    def spot_id(self, loc):
+        spot = self.grid.spot_by_xy.get((loc[0], loc[1]))
+        if spot is None:
+            return None
+        return spot[0] * self.grid.n_cols + spot[1]
+
+    def to_workstation(self, loc, ws_ind):
+        spot_id = self.spot_id(loc)
+        if spot_id is None:
+            return calc_distance(loc, self.ws_xy[ws_ind]) + self.layout.add_move(loc[1])
+        return self.spot_to_ws[spot_id, ws_ind]
+
+    def from_workstation(self, ws_ind, loc):
+        spot_id = self.spot_id(loc)
+        if spot_id is None:
+            return calc_distance(self.ws_xy[ws_ind], loc)
+        return self.ws_to_spot[ws_ind, spot_id]
+
 
 class Warehouse:
     """
@@ -210,90 +583,115 @@ class Warehouse:
     - rows of warehouse
     - pods list in warehouse
     - workstations
-    - picking aisles
-    - cross aisles
+    - picking aisles (pa blocks along x) and cross aisles (ca + 1 blocks along y)
+    - layout - the WarehouseLayout the spots, pods and workstations are built from,
+      with the block size, aisle widths and workstations count / positions
+    - items_per_pod - item types stored in every pod (each item type is spread over several pods)
+    Spots, pods and robots state is kept in arrays (StorageGrid, PodArrays, RobotArrays).
     """
-    def __init__(self, number_of_types=60, pa=12, ca=11, r_amount=2):
-        self.rows = []
+    def __init__(self, number_of_types=60, pa=12, ca=11, r_amount=2, robot_pool=None, ws_pool=None, streams=None,
+                 block_width=5, block_depth=2, aisle_width=2.0, cross_aisle_width=2.0, n_workstations=3,
+                 ws_positions=None, items_per_pod=1, picking_rate=1.0 / 15):
         self.pods_list = []
         self.ws_list = []
         self.pa = pa
         self.ca = ca
-        self.number_of_pods = self.pa * (self.ca + 1) * 10
+        # the geometry of spots and workstations, see layout.WarehouseLayout
+        self.layout = WarehouseLayout(pa=pa, ca=ca, block_width=block_width, block_depth=block_depth,
+                                      aisle_width=aisle_width, cross_aisle_width=cross_aisle_width,
+                                      n_workstations=n_workstations, ws_positions=ws_positions)
+        self.number_of_pods = self.layout.n_spots
         self.number_of_types = number_of_types
-        self.number_of_pods_per_type = int(self.number_of_pods / self.number_of_types)
+        self.items_per_pod = items_per_pod
+        self.number_of_pods_per_type = self.number_of_pods * items_per_pod // self.number_of_types
+        self.picking_rate = picking_rate
         self.item_types_list = []
         self.robot_list = []
         self.r_amount = r_amount
-
-    def build_row(self, y_init, p):
-        w = 3
-        x_jumps = 1
-        x_init = 0.5
-        y_jumps = 0
-        lst = [[x_init, y_init, 1]]
-        self.pods_list.append(Pod(p, x_init, y_init))
-        p += 1
-        for i in range(12):
-            for l in range(4):
-                lst.append([lst[-1][0] + x_jumps, lst[-1][1] + y_jumps, 1])
-                self.pods_list.append(Pod(p, lst[-1][0], lst[-1][1]))
-                p += 1
-            lst.append([lst[-1][0] + w, lst[-1][1] + y_jumps, 1])
-            self.pods_list.append(Pod(p, lst[-1][0], lst[-1][1]))
-            p += 1
-        self.pods_list = self.pods_list[:-1]
-        return lst[:-1], p - 1
+        self.pod_store = PodArrays(self.number_of_pods)
+        self.robot_store = RobotArrays(max(r_amount, 1))
+        self.grid = None
+        self.travel = None
+        self.free_pods = None
+        self.idle_robots = robot_pool if robot_pool is not None else IdleRobotPool()
+        self.free_workstations = ws_pool if ws_pool is not None else FreeWorkstationPool()
+        self.streams = streams if streams is not None else RandomStreams()
 
     def build_warehouse(self):
-        y_init = 2.5
-        p = 0
-        for i in range(24):
-            new, p = self.build_row(y_init, p)
-            self.rows.append(new)
-            if i % 2 == 0:
-                y_init += 3
-            else:
-                y_init += 1
+        # every spot holds a pod at the start, pod p in spot p
+        self.grid = StorageGrid.from_arrays(self.layout.spot_xy, np.ones((self.layout.n_rows, self.layout.n_cols),
+                                                                         dtype=np.int8))
+        self.build_pods()
         self.build_ws()
+        self.travel = TravelTable(self.grid, self.ws_list, self.layout)
         self.build_pods_per_items()
         self.create_robots()
 
+    def build_pods(self):
+        pod_xy = self.layout.spot_xy.reshape(-1, 2)
+        self.pod_store.xy[:self.number_of_pods] = pod_xy
+        self.pods_list = [Pod(p, x, y, store=self.pod_store) for p, (x, y) in enumerate(pod_xy.tolist())]
+
     def build_ws(self):
-        self.ws_list.append(WorkStation(6.0, 0, 0))
-        self.ws_list.append(WorkStation(41.0, 0, 1))
-        self.ws_list.append(WorkStation(76.0, 0, 2))
+        for ws_id, (x, y) in enumerate(self.layout.ws_xy.tolist()):
+            self.ws_list.append(WorkStation(x, y, ws_id, picking_rate=self.picking_rate,
+                                            rng=self.streams.picking_time))
+        for station in self.ws_list:
+            station.ws_pool = self.free_workstations
+            if station.is_free():
+                self.free_workstations.add(station)
 
     def build_pods_per_items(self):
-        nums = np.random.choice(self.number_of_pods, self.number_of_pods, replace=False)
+        item_pods, _ = assign_items_to_pods(self.number_of_pods, self.number_of_types,
+                                            self.streams.layout.permutation, self.items_per_pod)
         for i in range(self.number_of_types):
-            self.item_types_list.append(
-                Item(i, nums[self.number_of_pods_per_type * i:self.number_of_pods_per_type * (i + 1)]))
+            self.item_types_list.append(Item(i, item_pods[i]))
+        self.free_pods = FreePodIndex(self.number_of_types)
+        for item in self.item_types_list:
+            for pod_ind in item.item_pod_lst.tolist():
+                self.pods_list[pod_ind].pod_items.append(item.item_id)
+        for item in self.item_types_list:
+            for pod_ind in item.item_pod_lst.tolist():
+                pod = self.pods_list[pod_ind]
+                if pod.pod_index is None:
+                    pod.pod_index = self.free_pods
+                    self.free_pods.add_pod(pod)
 
     def create_robots(self):
-        for r in range(self.r_amount):
-            self.robot_list.append(Robot(0, 0, r))
-
-    # def find_xy(self, x, y):
-    #     for row in range(24):
-    #         for col in range(60):
-    #             if [x, y, 1] == self.rows[row][col]:
-    #                 return row, col
+        self.add_robots(self.r_amount)
+
+    def add_robots(self, amount):
+        """Adds amount idle robots at (0, 0) and returns them - also used on a running warehouse"""
+        new_robots = []
+        for r in range(len(self.robot_list), len(self.robot_list) + amount):
+            robot = Robot(0, 0, r, store=self.robot_store)
+            robot.r_pool = self.idle_robots
+            robot.r_travel = self.travel
+            self.robot_list.append(robot)
+            self.idle_robots.add(robot)
+            new_robots.append(robot)
+        self.r_amount = len(self.robot_list)
+        return new_robots
 
     def find_by_xy(self, x, y):
-        for row in range(24):
-            for col in range(60):
-                if [x, y, 1] == self.rows[row][col]:
-                    return row, col
+        return self.grid.find_by_xy(x, y)
+
+    @property
+    def rows(self):
+        # [x, y, occupancy] of every spot, built from the grid
+        if self.grid is None:
+            return []
+        return [[self.find_by_arr(row, col) for col in range(self.grid.n_cols)] for row in range(self.grid.n_rows)]
 
     def find_by_arr(self, row, col):
-        return self.rows[row][col]
+        spot_x, spot_y = self.grid.spot_xy[row, col].tolist()
+        return [spot_x, spot_y, int(self.grid.occupancy[row, col])]
 
     def update_empty_warehouse(self, row, col):
-        self.rows[row][col][2] = 0
+        self.grid.release(row, col)
 
     def update_not_empty_warehouse(self, row, col):
-        self.rows[row][col][2] = 1
+        self.grid.occupy(row, col)
 
     def find_pod_by_ind(self, pod_ind):
         return self.pods_list[pod_ind]
@@ -302,34 +700,34 @@ class Warehouse:
         return self.ws_list[ws_ind]
 
     def find_available_robots(self):
-        available_robots = []
-        for robot in self.robot_list:
-            if robot.is_free():
-                available_robots.append(robot)
-        return available_robots
+        return list(self.idle_robots)
+
+    def get_free_robot(self, target=None):
+        return self.idle_robots.select(target)
 
     def find_available_pods(self, item_type):
-        # check the location of the pods contain this item type
-        curr_item_pods_list = self.item_types_list[item_type].item_pod_lst
-        available_pods = []
-        for pod_ind in curr_item_pods_list:
-            pod = self.pods_list[pod_ind]
-            if pod.is_free():
-                available_pods.append(pod)
-        return available_pods
+        return list(self.free_pods.free_pods[item_type])
+
+    def count_available_pods(self, item_type):
+        return self.free_pods.count(item_type)
+
+    def sample_available_pod(self, item_type, pod_ind):
+        return self.free_pods.get_pod(item_type, pod_ind)
 
     def find_available_workstations(self):
-        available_ws = []
-        for station in self.ws_list:
-            if station.is_free():
-                available_ws.append(station)
-        return available_ws
+        return list(self.free_workstations)
+
+    def get_free_workstation(self, target=None):
+        return self.free_workstations.select(target)
 
     def release_pod_spot(self, loc):
         ws_row, ws_col = self.find_by_xy(loc[0], loc[1])
         self.update_empty_warehouse(ws_row, ws_col)
         return ws_row, ws_col
 
+    def sample_empty_spot(self, spot_ind):
+        return self.grid.empty_spots[spot_ind]
+
     def keep_empty_spot(self, row, col):
         spot_x, spot_y, occupancy = self.find_by_arr(row, col)
         self.update_not_empty_warehouse(row, col)
@@ -0,0 +1,166 @@
+"""Regression checks - fixed seed runs against stored summaries, and round trips of the indexes.
+
+The stored summaries are snapshots of what this code produces for a seed, recorded after the event
+calendar, the order backlog, the travel table, the slotted entities and the layout were reworked;
+they catch a later change of the results, they do not show that the rework kept the old ones.
+The event calendar and the indexes are checked against simple reference implementations.
+
+    python -m pytest -q test_regression.py
+    python test_regression.py
+"""
+import math
+import random
+
+import numpy as np
+
+from checkpoint import dumps_simulation, loads_simulation
+from event_calendar import EventCalendar
+from order_backlog import OrderBacklog
+from simulation import Simulation
+from system_objects import FreePodIndex, Order, StorageGrid, Warehouse
+
+SUMMARY_KEYS = ('n_arrived', 'n_served', 'mean_sojourn', 'mean_wip', 'q90_sojourn')
+# (Simulation arguments, snapshot summary, number of events)
+REFERENCE_RUNS = [
+    (dict(time_limit=604800 * 2, robot_num=2, order_enter_rate=0.013, seed=1),
+     {'n_arrived': 15701, 'n_served': 14132, 'mean_sojourn': 369.8958369318594, 'mean_wip': 4.801454760940007,
+      'q90_sojourn': 793.5897726457365}, 78490),
+    (dict(time_limit=86400, robot_num=10, order_enter_rate=0.05, seed=7,
+          warehouse_params={'pa': 8, 'ca': 7, 'cross_aisle_width': 3.0, 'items_per_pod': 2}),
+     {'n_arrived': 4167, 'n_served': 3798, 'mean_sojourn': 73.72189825645032, 'mean_wip': 3.600126652025055,
+      'q90_sojourn': 105.57911359941528}, 20827),
+]
+
+
+def check_summary(summary, expected):
+    for key, value in expected.items():
+        assert math.isclose(summary[key], value, rel_tol=1e-9), f'{key}: {summary[key]} != {value}'
+
+
+def test_reference_runs():
+    for params, expected, n_events in REFERENCE_RUNS:
+        simu_instance = Simulation(**params)
+        simu_instance.run_simulation()
+        check_summary(simu_instance.stats.summary(simu_instance.curr_time), expected)
+        assert simu_instance.n_events == n_events
+
+
+def test_checkpoint_round_trip():
+    params, expected, n_events = REFERENCE_RUNS[0]
+    simu_instance = Simulation(**params)
+    simu_instance.run_until(params['time_limit'] / 3)
+    restored = loads_simulation(dumps_simulation(simu_instance))
+    assert restored.curr_time == simu_instance.curr_time
+    restored.run_simulation()
+    check_summary(restored.stats.summary(restored.curr_time), expected)
+    assert restored.n_events == n_events
+
+
+def test_event_calendar_matches_sorted_reference():
+    # reference - the pending events stable sorted by time, the first one is the next event
+    rng = random.Random(4)
+    for _ in range(20):
+        calendar = EventCalendar()
+        reference = []
+        curr_time = 0.0
+        for step in range(2000):
+            action = rng.random()
+            if action < 0.5:
+                # few distinct times, so many events tie
+                event = calendar.schedule(rng.randrange(5), curr_time + rng.randrange(4), step)
+                reference.append(event)
+            elif action < 0.6 and reference:
+                event = rng.choice(reference)
+                calendar.cancel(event)
+                calendar.cancel(event)
+                reference.remove(event)
+            else:
+                expected = sorted(reference, key=lambda event: event.event_start)[0] if reference else None
+                assert calendar.peek_time() == (expected.event_start if expected else None)
+                assert calendar.next_event() is expected
+                if expected is not None:
+                    reference.remove(expected)
+                    curr_time = expected.event_start
+            assert len(calendar) == len(reference)
+        while reference:
+            expected = sorted(reference, key=lambda event: event.event_start)[0]
+            assert calendar.next_event() is expected
+            reference.remove(expected)
+        assert calendar.next_event() is None and len(calendar) == 0
+
+
+def test_free_pod_index_round_trip():
+    warehouse = Warehouse(r_amount=0, number_of_types=20, items_per_pod=2)
+    warehouse.build_warehouse()
+    index = warehouse.free_pods
+    rng = random.Random(1)
+    free = set(range(len(warehouse.pods_list)))
+    for _ in range(5000):
+        pod = rng.choice(warehouse.pods_list)
+        if pod.pod_id in free:
+            index.remove_pod(pod)
+            free.discard(pod.pod_id)
+        else:
+            index.add_pod(pod)
+            free.add(pod.pod_id)
+    for item_type in range(warehouse.number_of_types):
+        expected = {pod.pod_id for pod in warehouse.pods_list if pod.pod_id in free and item_type in pod.pod_items}
+        pods = [index.get_pod(item_type, pod_ind).pod_id for pod_ind in range(index.count(item_type))]
+        assert len(pods) == len(expected) and set(pods) == expected
+        assert all(index.pod_pos[item_type][pod_id] == pod_ind for pod_ind, pod_id in enumerate(pods))
+    fresh = FreePodIndex(warehouse.number_of_types)
+    for pod in warehouse.pods_list:
+        fresh.add_pod(pod)
+        fresh.add_pod(pod)
+        fresh.remove_pod(pod)
+    assert all(fresh.count(item_type) == 0 for item_type in range(warehouse.number_of_types))
+
+
+def test_storage_grid_round_trip():
+    rows, cols = 6, 10
+    spot_xy = np.stack(np.meshgrid(np.arange(cols) + 0.5, np.arange(rows) + 2.5), axis=-1)
+    occupancy = np.ones((rows, cols), dtype=np.int8)
+    occupancy[2, 3] = 0
+    grid = StorageGrid.from_arrays(spot_xy, occupancy)
+    rebuilt = StorageGrid([[(x, y, occ) for (x, y), occ in zip(row_xy.tolist(), row_occ.tolist())]
+                           for row_xy, row_occ in zip(spot_xy, occupancy)])
+    assert rebuilt.spot_by_xy == grid.spot_by_xy and rebuilt.empty_spots == grid.empty_spots
+    rng = random.Random(2)
+    for _ in range(2000):
+        row, col = rng.randrange(rows), rng.randrange(cols)
+        if grid.occupancy[row, col]:
+            grid.release(row, col)
+        else:
+            grid.occupy(row, col)
+        assert grid.find_by_xy(*spot_xy[row, col].tolist()) == (row, col)
+    assert set(grid.empty_spots) == {tuple(spot) for spot in np.argwhere(grid.occupancy == 0).tolist()}
+    assert all(grid.empty_pos[spot] == ind for ind, spot in enumerate(grid.empty_spots))
+    assert grid.num_empty_spots() + grid.num_occupied_spots() == rows * cols
+
+
+def test_order_backlog_round_trip():
+    backlog = OrderBacklog()
+    reference = []
+    rng = random.Random(3)
+    available = set(range(0, 8, 2))
+    for step in range(5000):
+        if rng.random() < 0.6:
+            order_obj = Order(float(step), rng.randrange(8))
+            backlog.append(order_obj)
+            reference.append(order_obj)
+        else:
+            expected = next((order_obj for order_obj in reference if order_obj.o_item in available), None)
+            assert backlog.pop_oldest(lambda item_type: item_type in available) is expected
+            if expected is not None:
+                reference.remove(expected)
+        if step % 500 == 0:
+            available = set(rng.sample(range(8), 4))
+        assert len(backlog) == len(reference)
+    assert list(backlog) == reference
+
+
+if __name__ == '__main__':
+    for name, check in list(globals().items()):
+        if name.startswith('test_'):
+            check()
+            print(f'{name} ok')
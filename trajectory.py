@@ -0,0 +1,124 @@
+import numpy as np
+
+TRAJECTORY_MODES = ('full', 'sample', 'minmax')
+
+
+class GrowableBuffer:
+    """
+    #### Preallocated 2D float buffer that doubles its capacity when full
+    If a path is given the buffer is a memory mapped file on disk, so only the pages in
+    use stay in memory.
+    """
+    def __init__(self, n_cols, capacity=4096, path=None):
+        self.n_cols = n_cols
+        self.path = path
+        self.size = 0
+        self.data = self.allocate(capacity, new_file=True)
+
+    def allocate(self, capacity, new_file=False):
+        if self.path is None:
+            return np.empty((capacity, self.n_cols), dtype=np.float64)
+        # numpy extends the file when it is opened with a larger shape
+        return np.memmap(self.path, dtype=np.float64, mode='w+' if new_file else 'r+',
+                         shape=(capacity, self.n_cols))
+
+    def append(self, row):
+        if self.size == len(self.data):
+            if self.path is None:
+                new_data = self.allocate(2 * len(self.data))
+                new_data[:self.size] = self.data
+            else:
+                self.data.flush()
+                new_data = self.allocate(2 * len(self.data))
+            self.data = new_data
+        self.data[self.size] = row
+        self.size += 1
+        return
+
+    def view(self):
+        return self.data[:self.size]
+
+    def flush(self):
+        if self.path is not None:
+            self.data.flush()
+        return
+
+    def __getstate__(self):
+        # a pickled buffer keeps its rows in memory, so a restored copy never writes to the original file
+        return {'n_cols': self.n_cols, 'path': None, 'size': self.size, 'data': np.array(self.view())}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if len(self.data) == 0:
+            self.data = self.allocate(1)
+
+
+class TrajectoryRecorder:
+    """
+    #### Recorder of a piecewise constant trajectory (e.g. number of orders in the warehouse)
+    ##### modes
+    - full - every change is recorded
+    - sample - the value is sampled every time_step
+    - minmax - one row per time_step bucket with the minimum and maximum in the bucket
+    """
+    def __init__(self, mode='full', time_step=None, capacity=4096, path=None):
+        if mode not in TRAJECTORY_MODES:
+            raise ValueError(f'Unknown trajectory mode {mode}, expected one of {TRAJECTORY_MODES}')
+        if mode != 'full' and (time_step is None or time_step <= 0):
+            raise ValueError(f'Trajectory mode {mode} needs a positive time_step')
+        self.mode = mode
+        self.time_step = time_step
+        self.buffer = GrowableBuffer(3 if mode == 'minmax' else 2, capacity, path)
+        self.curr_value = None
+        self.next_time = None
+        self.bucket_min = None
+        self.bucket_max = None
+
+    def start(self, curr_time, value):
+        self.curr_value = value
+        if self.mode == 'full':
+            self.buffer.append((curr_time, value))
+        elif self.mode == 'sample':
+            self.buffer.append((curr_time, value))
+            self.next_time = curr_time + self.time_step
+        else:
+            self.next_time = curr_time + self.time_step
+            self.bucket_min = self.bucket_max = value
+        return
+
+    def record(self, curr_time, value):
+        if self.mode == 'full':
+            self.buffer.append((curr_time, value))
+        elif self.mode == 'sample':
+            while self.next_time <= curr_time:
+                self.buffer.append((self.next_time, self.curr_value))
+                self.next_time += self.time_step
+        else:
+            while self.next_time <= curr_time:
+                self.close_bucket()
+            self.bucket_min = min(self.bucket_min, value)
+            self.bucket_max = max(self.bucket_max, value)
+        self.curr_value = value
+        return
+
+    def close_bucket(self):
+        self.buffer.append((self.next_time - self.time_step, self.bucket_min, self.bucket_max))
+        self.next_time += self.time_step
+        self.bucket_min = self.bucket_max = self.curr_value
+        return
+
+    def __len__(self):
+        return self.buffer.size
+
+    def as_arrays(self):
+        """Times and values for plotting - the minmax mode gives both extremes of every bucket"""
+        rows = self.buffer.view()
+        if self.mode != 'minmax':
+            return rows[:, 0], rows[:, 1]
+        times = np.repeat(rows[:, 0], 2)
+        values = rows[:, 1:].reshape(-1)
+        if self.bucket_min is not None:
+            # the bucket still open
+            times = np.append(times, [self.next_time - self.time_step] * 2)
+            values = np.append(values, [self.bucket_min, self.bucket_max])
+        return times, values
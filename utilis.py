@@ -1,9 +1,6 @@
-from scipy.spatial import distance
-
-
 def calc_distance(loc1, loc2):
-    dist = distance.cityblock(loc1, loc2)
-    return dist
+    # rectilinear (cityblock) distance between two points
+    return abs(loc1[0] - loc2[0]) + abs(loc1[1] - loc2[1])
 
 
 def calc_time_dur(dist, speed):
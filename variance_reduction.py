@@ -0,0 +1,124 @@
+"""Variance reduced estimates from replicated runs (see run_grid's common_random_numbers and antithetic).
+
+- Common random numbers - replication r of every cell runs on the same seed, with the picking work
+  drawn when the order arrives, so the cells see the same arrivals, items and picking times and a
+  difference between two cells is estimated from paired replications (paired_difference).
+- Antithetic pairs - the two replications of a pair run on the same seed, the second one on the
+  antithetic streams; the average of the pair is one observation (cell_observations).
+- Control variate - the arrival rate observed after the warm-up, whose mean order_enter_rate is
+  known, corrects every observation by its regression on the rate error (control_variate_mean).
+"""
+import numpy as np
+
+from output_analysis import t_quantile
+
+
+def arrival_control(result):
+    """Arrival rate after the warm-up of a run minus order_enter_rate - a control variate with mean 0"""
+    duration = result['end_time'] - result['warmup_time']
+    n_arrived = result['n_arrived'] - result['n_arrived_warmup']
+    return n_arrived / duration - result['order_enter_rate']
+
+
+def cell_observations(results, metric='mean_sojourn'):
+    """
+    Independent observations of metric and of the arrival control in the runs of one cell
+    - the run values, or the pair averages if the cell was run in antithetic pairs
+    """
+    results = sorted(results, key=lambda result: result['replication'])
+    values = np.array([result[metric] for result in results], dtype=float)
+    controls = np.array([arrival_control(result) for result in results])
+    if 'antithetic' in results[0]:
+        pairs = np.array([result['replication'] // 2 for result in results])
+        n_pairs = pairs.max() + 1
+        counts = np.bincount(pairs, minlength=n_pairs)
+        values = np.bincount(pairs, weights=values, minlength=n_pairs) / counts
+        controls = np.bincount(pairs, weights=controls, minlength=n_pairs) / counts
+    return values, controls
+
+
+def mean_ci(values, confidence=0.95):
+    """Mean and t confidence interval half width of independent observations"""
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    if n < 2:
+        return float(y.mean()) if n else float('nan'), float('inf')
+    half_width = t_quantile(0.5 + confidence / 2, n - 1) * y.std(ddof=1) / np.sqrt(n)
+    return float(y.mean()), float(half_width)
+
+
+def control_variate_mean(values, controls, confidence=0.95):
+    """
+    Control variate estimate of the mean of values - values - beta * controls, with controls of
+    known mean 0 and beta fitted by least squares. The half width includes the error of beta;
+    variance_ratio is the variance of the estimate relative to the plain mean's.
+    """
+    y = np.asarray(values, dtype=float)
+    c = np.asarray(controls, dtype=float)
+    n = len(y)
+    c_dev = c - c.mean()
+    sxx = float(c_dev @ c_dev)
+    if n < 5 or sxx == 0:
+        mean, half_width = mean_ci(y, confidence)
+        return {'mean': mean, 'half_width': half_width, 'n_obs': n, 'beta': 0.0, 'variance_ratio': 1.0}
+    beta = float(c_dev @ (y - y.mean())) / sxx
+    residuals = y - y.mean() - beta * c_dev
+    var_mean = float(residuals @ residuals) / (n - 2) * (1.0 / n + c.mean() ** 2 / sxx)
+    plain_var_mean = y.var(ddof=1) / n
+    return {
+        'mean': float(y.mean() - beta * c.mean()),
+        'half_width': float(t_quantile(0.5 + confidence / 2, n - 2) * np.sqrt(var_mean)),
+        'n_obs': n,
+        'beta': beta,
+        'variance_ratio': float(var_mean / plain_var_mean) if plain_var_mean > 0 else 1.0,
+    }
+
+
+def cell_estimate(results, metric='mean_sojourn', control_variate=True, confidence=0.95):
+    """
+    Estimate of metric from the runs of one cell - antithetic pairs averaged, with the arrival control variate.
+    A cell with an unstable run (see run_grid's instability) has no steady state, its mean is nan.
+    """
+    if any(result.get('unstable') for result in results):
+        return {'mean': float('nan'), 'half_width': float('inf'), 'n_obs': 0, 'beta': 0.0, 'variance_ratio': 1.0,
+                'n_runs': len(results), 'unstable': True}
+    values, controls = cell_observations(results, metric)
+    if control_variate:
+        res = control_variate_mean(values, controls, confidence)
+    else:
+        mean, half_width = mean_ci(values, confidence)
+        res = {'mean': mean, 'half_width': half_width, 'n_obs': len(values), 'beta': 0.0, 'variance_ratio': 1.0}
+    res['n_runs'] = len(results)
+    res['unstable'] = False
+    return res
+
+
+def group_cells(results, cell_keys=('robot_num', 'order_enter_rate')):
+    """Runs grouped by the values of cell_keys, in the order the cells first appear"""
+    cells = {}
+    for result in results:
+        cells.setdefault(tuple(result[key] for key in cell_keys), []).append(result)
+    return cells
+
+
+def sweep_estimates(results, metric='mean_sojourn', cell_keys=('robot_num', 'order_enter_rate'),
+                    control_variate=True, confidence=0.95):
+    """cell_estimate of every cell of a run_grid sweep, with the cell_keys values"""
+    res = []
+    for cell, cell_results in group_cells(results, cell_keys).items():
+        estimate = dict(zip(cell_keys, cell))
+        estimate.update(cell_estimate(cell_results, metric, control_variate, confidence))
+        res.append(estimate)
+    return res
+
+
+def paired_difference(results_a, results_b, metric='mean_sojourn', confidence=0.95):
+    """
+    Mean and confidence interval half width of metric in cell b minus cell a, from replications
+    run with common random numbers (replication r of both cells on the same seed)
+    """
+    values_a, _ = cell_observations(results_a, metric)
+    values_b, _ = cell_observations(results_b, metric)
+    if len(values_a) != len(values_b):
+        raise ValueError(f'paired cells need the same replications, got {len(values_a)} and {len(values_b)}')
+    return mean_ci(values_b - values_a, confidence)